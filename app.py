@@ -1,11 +1,35 @@
 #app.py
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 import time
-import json
 import logging
 import os
 from datetime import datetime, timedelta
-import csv
+import base64
+import cProfile
+import functools
+import gc
+import re
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from packing import (ContainerSpace, ZoneIndex, item_dimensions, container_dimensions,
+                     position_to_box, box_to_position, packing_order, pack_zone, init_pack_worker)
+from search_index import TextIndex
+from expiry import ExpiryQueue, parse_timestamp
+from simulation import DAY, expiry_day, usage_outcome
+from logstore import LogStore
+from audit import AuditLog
+from persistence import StateStore, WriteAheadLog, SQLiteStore
+from itemstore import ColumnarItemStore, iter_records, unplaced_item_ids
+from rearrange import plan_rearrangement
+from knapsack import select_items
+from metrics import Registry, SIZE_BUCKETS, BATCH_BUCKETS
+from response_cache import ResponseCache
+from changefeed import ChangeFeed
+from bulk_io import (iter_csv_rows, iter_ndjson_rows, chunked, CHUNK_SIZE,
+                     ARRANGEMENT_HEADER, CONTAINER_HEADER, csv_lines, arrangement_rows,
+                     container_rows, ndjson_lines)
 
 # Initialize Flask application
 app = Flask(__name__)
@@ -20,22 +44,327 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# In-memory database
+# Audit output is written by a background thread; set AUDIT_LOG_FILE to also
+# keep an append-only JSON lines copy (AUDIT_LOG_FSYNC=1 to fsync each batch)
+audit_log = AuditLog(
+    logger,
+    path=os.environ.get('AUDIT_LOG_FILE'),
+    fsync=os.environ.get('AUDIT_LOG_FSYNC') == '1'
+)
+
+# In-memory database; ITEM_STORE=columnar keeps items in compact NumPy
+# columns instead of one dict per item, for very large inventories
+ITEM_STORE = os.environ.get('ITEM_STORE', 'dict')
 containers = {}
-items = {}
-system_logs = []
+items = ColumnarItemStore() if ITEM_STORE == 'columnar' else {}
 current_time = datetime.now()
 
+# System logs, capped at LOG_CAPACITY entries (oldest are dropped first)
+LOG_CAPACITY = int(os.environ.get('LOG_CAPACITY', 100000))
+system_logs = LogStore(LOG_CAPACITY)
+
+# Free-space tracking per container, kept in sync with item positions
+container_spaces = {}
+zone_index = ZoneIndex()
+min_item_side = float('inf')
+
+# Placement batches of at least PARALLEL_PLACEMENT_MIN items spread over
+# several zones are packed one zone per process, on PLACEMENT_WORKERS processes
+CPU_COUNT = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+PLACEMENT_WORKERS = int(os.environ.get('PLACEMENT_WORKERS', CPU_COUNT))
+PARALLEL_PLACEMENT_MIN = int(os.environ.get('PARALLEL_PLACEMENT_MIN', 2000))
+placement_pool = None
+
+# Compute budget for proposing rearrangements when items do not fit
+REARRANGE_BUDGET_MS = float(os.environ.get('REARRANGE_BUDGET_MS', 250))
+
+# Metrics served at /metrics. Setting PROFILE_SLOW_MS profiles every request
+# and keeps the cProfile stats of those slower than that in PROFILE_DIR
+metrics = Registry()
+request_count = metrics.counter('cargo_http_requests_total', "HTTP requests by route, method and status",
+                                ('route', 'method', 'status'))
+request_duration = metrics.histogram('cargo_http_request_duration_seconds', "HTTP request latency",
+                                     ('route', 'method'))
+request_size = metrics.histogram('cargo_http_request_size_bytes', "HTTP request body size",
+                                 ('route', 'method'), SIZE_BUCKETS)
+response_size = metrics.histogram('cargo_http_response_size_bytes', "HTTP response body size (streamed responses excluded)",
+                                  ('route', 'method'), SIZE_BUCKETS)
+placement_batch = metrics.histogram('cargo_placement_batch_items', "Items waiting for placement per placement request",
+                                    buckets=BATCH_BUCKETS)
+placement_duration = metrics.histogram('cargo_placement_duration_seconds', "Time spent packing per placement request")
+metrics.gauge('cargo_items', "Items on the station", lambda: len(items))
+metrics.gauge('cargo_containers', "Containers on the station", lambda: len(containers))
+metrics.gauge('cargo_log_entries', "Log entries kept for the logs API", lambda: len(system_logs))
+PROFILE_SLOW_MS = float(os.environ['PROFILE_SLOW_MS']) if os.environ.get('PROFILE_SLOW_MS') else None
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+# State versions. A request bumps the version of every collection it changed
+# (and the global one) once, when it finishes. Readers do not wait for
+# writers, so a response built while a write is under way may show part of
+# it: only responses built while no write ran are tagged with the versions
+# they depend on and cached until those change. The ETag also names the
+# process, whose versions are its own.
+state_version = 0
+collection_versions = {"containers": 0, "items": 0, "time": 0}
+versions_lock = threading.Lock()
+writes_started = 0
+writes_running = 0
+pending_changes = threading.local()
+INSTANCE_ID = f"{os.urandom(4).hex()}-{os.getpid():x}"
+response_cache = ResponseCache(int(float(os.environ.get('RESPONSE_CACHE_MB', 64)) * 1024 * 1024))
+cache_requests = metrics.counter('cargo_response_cache_requests_total',
+                                 "Versioned GET responses by outcome (hit, miss, not_modified)", ('result',))
+
+# Change feed for mirrors, remembering the latest change of up to
+# CHANGE_FEED_CAPACITY records; its sequence numbers are per process too.
+# With the SQLite backend the feed is served from the database's change log
+# instead, so every worker process answers with the same sequence numbers
+change_feed = ChangeFeed(int(os.environ.get('CHANGE_FEED_CAPACITY', 200000)))
+
+# Perishable items waiting to expire, ordered by expiry date
+expiry_queue = ExpiryQueue()
+
+# Item statuses that mark an item as waste
+WASTE_STATUSES = ('expired', 'depleted')
+
+# Bulk upload formats accepted by the import API
+CSV_MIMETYPES = ('text/csv', 'application/csv')
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+MAX_REPORTED_ERRORS = 100
+
+# Search pagination limits
+DEFAULT_SEARCH_LIMIT = 100
+MAX_SEARCH_LIMIT = 1000
+
+# Search indexes, kept in sync with the items and containers dicts
+item_search_index = TextIndex(['itemId', 'name', 'description'], 'preferredZone', zone_substring=True)
+container_search_index = TextIndex(['containerId', 'name', 'description'], 'zone')
+
+# State storage backend, chosen with STORAGE_BACKEND:
+# - memory (default): state lives in this process only
+# - wal: every change is journaled to a write-ahead log in DATA_DIR and a
+#   snapshot is taken every SNAPSHOT_EVERY changes (WAL_FSYNC=1 to fsync)
+# - sqlite: state is shared through the SQLite database at SQLITE_PATH, so the
+#   API can run under several worker processes
+# The backend is opened at the end of startup.
+DATA_DIR = os.environ.get('DATA_DIR')
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'wal' if DATA_DIR else 'memory')
+SNAPSHOT_EVERY = int(os.environ.get('SNAPSHOT_EVERY', 100000))
+SQLITE_PATH = os.environ.get('SQLITE_PATH', os.path.join(DATA_DIR or '.', 'station.db'))
+state_store = StateStore()
+
+# Changes replayed from storage must not be journaled again
+replaying = threading.local()
+
+# Requests that change state run one at a time under state_lock. Requests
+# that only read never take it: records are replaced, never changed in place,
+# and the indexes they use lock internally, so a reader sees each record
+# either before or after a write. A reader running during a write that
+# changes several records may see some of them changed and others not.
+state_lock = threading.RLock()
+
 # Helper function to log actions
-def log_action(action, details):
-    timestamp = datetime.now().isoformat()
+def log_action(action, details, item_id=None, user_id=None):
     log_entry = {
-        "timestamp": timestamp,
         "action": action,
         "details": details
     }
-    system_logs.append(log_entry)
-    logger.info(f"{action}: {details}")
+    if item_id is not None:
+        log_entry["itemId"] = item_id
+    if user_id is not None:
+        log_entry["userId"] = user_id
+    log_entry, moment = system_logs.append(log_entry)
+    audit_log.submit(log_entry, moment)
+
+# Helper functions to journal state changes to the write-ahead log
+OP_COLLECTIONS = {"container": "containers", "item": "items", "remove": "items", "time": "time"}
+
+def journal(op):
+    if op['op'] in OP_COLLECTIONS:
+        touch(OP_COLLECTIONS[op['op']])
+    if getattr(replaying, 'active', False):
+        # Replayed operations are already in the store and the feed restarts
+        return
+    if op['op'] == 'container':
+        change_feed.record("containers", op['record']['containerId'])
+    elif op['op'] == 'item':
+        change_feed.record("items", op['record']['itemId'])
+    elif op['op'] == 'remove':
+        change_feed.record("items", op['itemId'], removed=True)
+    state_store.log(op)
+
+# Helper functions for state versions
+def touch(collection):
+    changed = getattr(pending_changes, 'collections', None)
+    if changed is None:
+        changed = pending_changes.collections = set()
+    changed.add(collection)
+
+def publish_changes():
+    # Called once the changes of a request (or of a replay) are complete
+    global state_version
+    changed = getattr(pending_changes, 'collections', None)
+    if not changed:
+        return
+    with versions_lock:
+        state_version += 1
+        for collection in changed:
+            collection_versions[collection] += 1
+    changed.clear()
+
+def start_write():
+    global writes_started, writes_running
+    with versions_lock:
+        writes_started += 1
+        writes_running += 1
+
+def finish_write():
+    global writes_running
+    with versions_lock:
+        writes_running -= 1
+
+def versioned_response(collections):
+    # Serve a GET view with an ETag built from the versions of the
+    # collections it reads: If-None-Match gets a 304 and unchanged responses
+    # come from the cache without running the view
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            names = collections()
+            with versions_lock:
+                versions = tuple(collection_versions[name] for name in names)
+                writes = writes_started if writes_running == 0 else None
+            etag = INSTANCE_ID + ''.join(f"-{name[0]}{version}" for name, version in zip(names, versions))
+            if etag in request.if_none_match:
+                cache_requests.inc('not_modified')
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+            
+            key = (request.path, tuple(sorted(request.args.items(multi=True))))
+            cached = response_cache.get(key, versions)
+            if cached is not None:
+                cache_requests.inc('hit')
+                response = Response(cached[0], mimetype=cached[1])
+                response.set_etag(etag)
+                return response
+            
+            cache_requests.inc('miss')
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            # Only a body built while no write ran is known to show exactly
+            # these versions; streamed bodies are built after this returns
+            with versions_lock:
+                consistent = writes is not None and writes_running == 0 and writes_started == writes
+            if consistent:
+                response.set_etag(etag)
+                response_cache.put(key, versions, response.get_data(), response.mimetype)
+            return response
+        return wrapper
+    return decorator
+
+def search_collections():
+    item_type = request.args.get('type', 'all')
+    return [name for name, kind in (("containers", "container"), ("items", "item")) if item_type in ('all', kind)]
+
+def export_collections():
+    export_type = request.args.get('type', 'all')
+    return [name for name in ("containers", "items") if export_type in ('all', name)]
+
+def journal_item(item):
+    journal({"op": "item", "record": item})
+
+# Helper functions to keep container free space and the indexes in sync
+def register_container(container):
+    container_id = container['containerId']
+    containers[container_id] = container
+    journal({"op": "container", "record": container})
+    container_search_index.add(container_id, container)
+    space = container_spaces.get(container_id)
+    if space is None:
+        container_spaces[container_id] = ContainerSpace(*container_dimensions(container),
+                                                        min_side=min_item_side)
+    else:
+        space.resize(*container_dimensions(container))
+    refresh_zone_index(container_id)
+
+def refresh_zone_index(container_id):
+    zone_index.update(container_id, containers[container_id].get('zone'),
+                      container_spaces[container_id].remaining_volume)
+
+def register_item(item, bulk=False):
+    """Add item to the indexes; in bulk, search grams and the zone index are left to the caller."""
+    global min_item_side
+    item_id = item['itemId']
+    # Free spaces thinner than the smallest item side are useless to every item
+    side = min(item_dimensions(item))
+    if side < min_item_side:
+        min_item_side = side
+        for space in container_spaces.values():
+            space.set_min_side(side)
+    if item_id in items:
+        release_item(item_id)
+    item.setdefault('containerId', None)
+    item.setdefault('position', None)
+    items[item_id] = item
+    journal_item(item)
+    item_search_index.add(item_id, item, defer=bulk)
+    schedule_expiry(item)
+    container_id = item['containerId']
+    if container_id in container_spaces and item['position']:
+        container_spaces[container_id].add(item_id, position_to_box(item['position']))
+        if not bulk:
+            refresh_zone_index(container_id)
+
+def update_item(item_id, **changes):
+    # Copy-on-write, so readers never see a partly updated record
+    item = dict(items[item_id], **changes)
+    items[item_id] = item
+    journal_item(item)
+    return item
+
+def set_item_position(item_id, container_id, position):
+    release_item(item_id)
+    update_item(item_id, containerId=container_id, position=position)
+    if container_id in container_spaces:
+        container_spaces[container_id].add(item_id, position_to_box(position))
+        refresh_zone_index(container_id)
+
+def clear_item_position(item_id):
+    release_item(item_id)
+    update_item(item_id, containerId=None, position=None)
+
+def unregister_container(container_id):
+    containers.pop(container_id)
+    touch("containers")
+    change_feed.record("containers", container_id, removed=True)
+    container_search_index.remove(container_id)
+    container_spaces.pop(container_id)
+    zone_index.discard(container_id)
+
+def unregister_item(item_id):
+    release_item(item_id)
+    journal({"op": "remove", "itemId": item_id})
+    item_search_index.remove(item_id)
+    expiry_queue.cancel(item_id)
+    return items.pop(item_id)
+
+def schedule_expiry(item):
+    # Expiry dates are parsed once here instead of on every time step
+    expiry_date = None
+    if item.get('perishable') and item.get('expiryDate') and item.get('status') not in WASTE_STATUSES:
+        expiry_date = parse_timestamp(item['expiryDate'])
+    if expiry_date is None:
+        expiry_queue.cancel(item['itemId'])
+    else:
+        expiry_queue.schedule(item['itemId'], expiry_date)
+
+def release_item(item_id):
+    container_id = items[item_id].get('containerId')
+    if container_id in container_spaces:
+        container_spaces[container_id].remove(item_id)
+        refresh_zone_index(container_id)
 
 # Root endpoint
 @app.route('/', methods=['GET'])
@@ -47,176 +376,501 @@ def home():
 def health_check():
     return jsonify({"status": "healthy"}), 200
 
+# Helper function to pack zones, on the process pool for big batches. The
+# workers start from a fork server that only loads packing.py: forking the
+# server itself would copy its threads' locks (state_lock among them) and
+# its listening socket
+def placement_context():
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['packing'])
+    return context
+
+def pack_zones(jobs):
+    global placement_pool
+    batch_size = sum(len(pending) for _, pending in jobs.values())
+    if PLACEMENT_WORKERS > 1 and len(jobs) > 1 and batch_size >= PARALLEL_PLACEMENT_MIN:
+        if placement_pool is None:
+            placement_pool = ProcessPoolExecutor(PLACEMENT_WORKERS, mp_context=placement_context(),
+                                                 initializer=init_pack_worker)
+        try:
+            # Biggest zones first, so no core is left with a large zone at the end
+            zones = sorted(jobs, key=lambda zone: len(jobs[zone][1]), reverse=True)
+            futures = {zone: placement_pool.submit(pack_zone, *jobs[zone]) for zone in zones}
+            return {zone: future.result() for zone, future in futures.items()}
+        except BrokenProcessPool:
+            # Workers only got copies of the spaces, so packing here is still safe
+            logger.warning("Placement worker pool failed, packing in process")
+            placement_pool = None
+    return {zone: pack_zone(*job) for zone, job in jobs.items()}
+
+# Helper function giving the rearrangement planner what it needs of an item
+def rearrangement_item_info(item_id):
+    item = items[item_id]
+    return item.get('priority') or 0, item.get('preferredZone')
+
 # 1. Placement API (basic placement functionality)
 @app.route('/api/placement', methods=['POST'])
 def placement():
     try:
         data = request.json
         
+        budget = data.get('rearrangementBudgetMs', REARRANGE_BUDGET_MS)
+        if isinstance(budget, bool) or not isinstance(budget, (int, float)) or not 0 <= budget < float('inf'):
+            return jsonify({"success": False, "error": "rearrangementBudgetMs must be a non-negative number"}), 400
+        
         # Process containers
         if 'containers' in data:
             for container in data['containers']:
-                container_id = container['containerId']
-                containers[container_id] = container
+                register_container(container)
                 
         # Process items
         if 'items' in data:
             for item in data['items']:
-                item_id = item['itemId']
-                items[item_id] = item
-                items[item_id]['containerId'] = None
-                items[item_id]['position'] = None
+                item['containerId'] = None
+                item['position'] = None
+                register_item(item)
+        
+        # Process placements, highest priority and largest items first. Items
+        # only go into containers of their preferred zone, so every zone is
+        # packed on its own
+        pending = [items[item_id] for item_id in unplaced_item_ids(items)]
+        pending.sort(key=packing_order)
+        
+        jobs = {}
+        for item in pending:
+            zone = item.get('preferredZone')
+            if zone not in jobs:
+                jobs[zone] = ({container_id: container_spaces[container_id]
+                               for container_id in zone_index.containers_in(zone)}, [])
+            jobs[zone][1].append((item['itemId'], item_dimensions(item)))
+        jobs = {zone: job for zone, job in jobs.items() if job[0]}
+        
+        # Merge the zones back into packing order, so the result is the same
+        # however the zones were run
+        order = {item['itemId']: position for position, item in enumerate(pending)}
+        packed = []
+        packing_started = time.perf_counter()
+        for zone_placements, spaces in pack_zones(jobs).values():
+            container_spaces.update(spaces)
+            for container_id in spaces:
+                refresh_zone_index(container_id)
+            packed.extend(zone_placements)
+        placement_batch.observe(len(pending))
+        placement_duration.observe(time.perf_counter() - packing_started)
         
-        # Process placements
         placements = []
-        for item_id, item in items.items():
-            # Skip items that are already placed
-            if item['containerId'] is not None:
-                continue
-                
-            preferred_zone = item.get('preferredZone')
+        for item_id, container_id, box in sorted(packed, key=lambda placement: order[placement[0]]):
+            position = box_to_position(box)
+            update_item(item_id, containerId=container_id, position=position)
             
-            # Find suitable container
-            for container_id, container in containers.items():
-                if container['zone'] == preferred_zone:
-                    # Place item in container
-                    items[item_id]['containerId'] = container_id
-                    
-                    # Simple placement at position (0,0,0)
-                    position = {
-                        "startCoordinates": [0, 0, 0],
-                        "endCoordinates": [
-                            item.get('width', 1),
-                            item.get('depth', 1),
-                            item.get('height', 1)
-                        ]
-                    }
-                    items[item_id]['position'] = position
-                    
-                    # Add to placements list
-                    placement = {
-                        "itemId": item_id,
-                        "containerId": container_id,
-                        "position": position
-                    }
-                    placements.append(placement)
-                    
-                    # Log the placement
-                    log_action("PLACEMENT", f"Item {item_id} placed in container {container_id}")
-                    break
+            # Add to placements list
+            placement = {
+                "itemId": item_id,
+                "containerId": container_id,
+                "position": position
+            }
+            placements.append(placement)
+            
+            # Log the placement
+            log_action("PLACEMENT", f"Item {item_id} placed in container {container_id}", item_id=item_id)
+        
+        # Propose moving lower-priority items out of the way of the items
+        # that did not fit, within the compute budget
+        placed = {placement["itemId"] for placement in placements}
+        unplaced = [(item['itemId'], item_dimensions(item), item.get('priority') or 0, item.get('preferredZone'))
+                    for item in pending
+                    if item['itemId'] not in placed and item.get('preferredZone') in jobs]
+        rearrangements, complete = [], True
+        if unplaced:
+            rearrangements, complete = plan_rearrangement(
+                unplaced, container_spaces, zone_index.containers_in, rearrangement_item_info, budget / 1000
+            )
         
         return jsonify({
             "success": True,
-            "placements": placements
+            "placements": placements,
+            "rearrangements": rearrangements,
+            "rearrangementComplete": complete
         }), 200
         
     except Exception as e:
         log_action("ERROR", f"Placement API error: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+# Helper functions for search pagination and field projection
+def encode_cursor(collection, sequence):
+    raw = f"{collection}:{-1 if sequence is None else sequence}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    collection, sequence = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+    sequence = int(sequence)
+    return collection, (None if sequence < 0 else sequence)
+
+def lookup_records(store, keys):
+    # Records removed since the index was searched are skipped
+    return [record for record in map(store.get, keys) if record is not None]
+
+def project_record(record, fields, id_field):
+    if not fields:
+        return record
+    projected = {id_field: record.get(id_field)}
+    for field in fields:
+        if field in record:
+            projected[field] = record[field]
+    return projected
+
 # 2. Search API
 @app.route('/api/search', methods=['GET'])
+@versioned_response(search_collections)
 def search():
     try:
         # Get query parameters
         query = request.args.get('query', '').lower()
         item_type = request.args.get('type', 'all')
         zone = request.args.get('zone')
+        limit = request.args.get('limit')
+        cursor = request.args.get('cursor')
+        fields = [field for field in request.args.get('fields', '').split(',') if field]
         
         results = {
             "items": [],
             "containers": []
         }
         
-        # Search items
+        sections = []
         if item_type in ['all', 'item']:
-            for item_id, item in items.items():
-                # Check if item matches search criteria
-                matches = (
-                    (not query or 
-                     query in item_id.lower() or 
-                     query in item.get('name', '').lower() or
-                     query in item.get('description', '').lower()) and
-                    (not zone or zone in item.get('preferredZone', ''))
-                )
-                
-                if matches:
-                    results["items"].append(item)
-        
-        # Search containers
+            sections.append(("items", item_search_index, items, 'itemId'))
         if item_type in ['all', 'container']:
-            for container_id, container in containers.items():
-                # Check if container matches search criteria
-                matches = (
-                    (not query or 
-                     query in container_id.lower() or 
-                     query in container.get('name', '').lower() or
-                     query in container.get('description', '').lower()) and
-                    (not zone or zone == container.get('zone', ''))
-                )
-                
-                if matches:
-                    results["containers"].append(container)
+            sections.append(("containers", container_search_index, containers, 'containerId'))
+        
+        # Without limit or cursor every match is returned, as before
+        if limit is None and cursor is None:
+            for name, index, store, id_field in sections:
+                results[name] = [project_record(record, fields, id_field)
+                                 for record in lookup_records(store, index.search(query, zone))]
+            
+            log_action("SEARCH", f"Search performed with query: {query}, type: {item_type}, zone: {zone}")
+            return jsonify({
+                "success": True,
+                "results": results
+            }), 200
+        
+        try:
+            limit = DEFAULT_SEARCH_LIMIT if limit is None else int(limit)
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_SEARCH_LIMIT:
+            return jsonify({
+                "success": False,
+                "error": f"limit must be an integer between 1 and {MAX_SEARCH_LIMIT}"
+            }), 400
+            
+        # The cursor names the collection and the last sequence number returned
+        after = None
+        if cursor:
+            try:
+                start, after = decode_cursor(cursor)
+                names = [section[0] for section in sections]
+                sections = sections[names.index(start):]
+            except ValueError:
+                return jsonify({
+                    "success": False,
+                    "error": "Invalid cursor"
+                }), 400
+        
+        # Fill the page from items first, then containers
+        remaining = limit
+        next_cursor = None
+        for name, index, store, id_field in sections:
+            if remaining == 0:
+                if index.page(query, zone, after=after, limit=1):
+                    next_cursor = encode_cursor(name, after)
+                    break
+            else:
+                matches = index.page(query, zone, after=after, limit=remaining + 1)
+                if len(matches) > remaining:
+                    matches = matches[:remaining]
+                    next_cursor = encode_cursor(name, matches[-1][0])
+                keys = [key for _, key in matches]
+                results[name] = [project_record(record, fields, id_field)
+                                 for record in lookup_records(store, keys)]
+                remaining -= len(matches)
+                if next_cursor:
+                    break
+            after = None
         
-        log_action("SEARCH", f"Search performed with query: {query}, type: {item_type}, zone: {zone}")
+        log_action("SEARCH", f"Search performed with query: {query}, type: {item_type}, zone: {zone}, limit: {limit}")
         return jsonify({
             "success": True,
-            "results": results
+            "results": results,
+            "nextCursor": next_cursor
         }), 200
         
     except Exception as e:
         log_action("ERROR", f"Search API error: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+# Helper function to plan a retrieval: blockers are taken out front to back,
+# set aside, and put back in reverse order once the item is out
+def retrieval_steps(item_id, spaces=container_spaces, container_id=None):
+    if container_id is None:
+        container_id = items[item_id].get('containerId')
+    space = spaces.get(container_id)
+    blockers = space.removal_order(item_id) if space is not None else []
+    
+    steps = []
+    def add_step(action, step_item_id):
+        steps.append({
+            "step": len(steps) + 1,
+            "action": action,
+            "itemId": step_item_id,
+            # Read without the state lock, a blocker may be gone by now
+            "itemName": (items.get(step_item_id) or {}).get('name')
+        })
+    for blocker_id in blockers:
+        add_step("remove", blocker_id)
+        add_step("setAside", blocker_id)
+    add_step("retrieve", item_id)
+    for blocker_id in reversed(blockers):
+        add_step("placeBack", blocker_id)
+    return steps
+
+# Helper functions for the retrieve, place and waste operations. Each one
+# checks and applies a single operation and returns (status code, result or
+# error message, undo function, log message); nothing is logged yet, so a
+# batch can still be rolled back
+def retrieve_operation(data):
+    if not data or 'itemId' not in data:
+        return 400, "Missing required field: itemId", None, None
+        
+    item_id = data['itemId']
+    
+    # Check if item exists
+    if item_id not in items:
+        return 404, f"Item {item_id} not found", None, None
+        
+    # Check if item is in a container
+    if items[item_id].get('containerId') is None:
+        return 400, f"Item {item_id} is not in a container", None, None
+        
+    # Get container information
+    container_id = items[item_id]['containerId']
+    position = items[item_id]['position']
+    
+    # Plan the retrieval, then remove item from container
+    steps = retrieval_steps(item_id)
+    clear_item_position(item_id)
+    
+    return 200, {
+        "itemId": item_id,
+        "containerId": container_id,
+        "position": position,
+        "retrievalSteps": steps
+    }, lambda: set_item_position(item_id, container_id, position), \
+        f"Item {item_id} retrieved from container {container_id}"
+
+def place_operation(data):
+    if not data or 'itemId' not in data or 'containerId' not in data:
+        return 400, "Missing required fields: itemId, containerId", None, None
+        
+    item_id = data['itemId']
+    container_id = data['containerId']
+    coordinates = data.get('coordinates', [0, 0, 0])
+    
+    # Check if item exists
+    if item_id not in items:
+        return 404, f"Item {item_id} not found", None, None
+        
+    # Check if container exists
+    if container_id not in containers:
+        return 404, f"Container {container_id} not found", None, None
+        
+    # Get item information
+    item = items[item_id]
+    
+    if (not isinstance(coordinates, list) or len(coordinates) != 3 or
+            not all(isinstance(c, (int, float)) for c in coordinates)):
+        return 400, "coordinates must be a list of three numbers", None, None
+    
+    # Calculate end coordinates based on item dimensions
+    end_coordinates = [
+        coordinates[0] + item.get('width', 1),
+        coordinates[1] + item.get('depth', 1),
+        coordinates[2] + item.get('height', 1)
+    ]
+    position = {
+        "startCoordinates": coordinates,
+        "endCoordinates": end_coordinates
+    }
+    
+    # Check the item stays inside the container and clear of other items
+    space = container_spaces[container_id]
+    box = position_to_box(position)
+    if not space.in_bounds(box):
+        return 400, f"Item {item_id} does not fit inside container {container_id} at {coordinates}", None, None
+        
+    collisions = space.collisions(box, exclude=item_id)
+    if collisions:
+        return 409, (f"Item {item_id} would overlap items {', '.join(map(str, collisions))} "
+                     f"in container {container_id}"), None, None
+    
+    # Place item in container, remembering where it was
+    previous_container_id = item.get('containerId')
+    previous_position = item.get('position')
+    set_item_position(item_id, container_id, position)
+    
+    def undo():
+        if previous_container_id is not None and previous_position:
+            set_item_position(item_id, previous_container_id, previous_position)
+        else:
+            clear_item_position(item_id)
+    
+    return 200, {
+        "itemId": item_id,
+        "containerId": container_id,
+        "position": position
+    }, undo, f"Item {item_id} placed in container {container_id} at {coordinates}"
+
+def waste_operation(data):
+    if not data or 'itemId' not in data:
+        return 400, "Missing required field: itemId", None, None
+        
+    item_id = data['itemId']
+    
+    # Check if item exists
+    if item_id not in items:
+        return 404, f"Item {item_id} not found", None, None
+        
+    # Get container information if item is in a container
+    container_id = items[item_id].get('containerId')
+    
+    # Remove item from system
+    removed_item = unregister_item(item_id)
+    
+    return 200, {
+        "itemId": item_id,
+        "containerId": container_id,
+        "status": "removed"
+    }, lambda: register_item(removed_item), \
+        f"Item {item_id} removed from system" + (f" and container {container_id}" if container_id else "")
+
+# Helper function to run a batch of operations. Without allOrNothing every
+# operation is applied on its own; with it, one failure undoes them all.
+def run_batch(operation, action, result_key):
+    data = request.json
+    
+    if not data or not isinstance(data.get('operations'), list):
+        return jsonify({
+            "success": False,
+            "error": "Missing required field: operations (a list)"
+        }), 400
+        
+    all_or_nothing = bool(data.get('allOrNothing', False))
+    default_user_id = data.get('userId')
+    
+    results = []
+    applied = []
+    try:
+        for index, op in enumerate(data['operations']):
+            if isinstance(op, dict) and default_user_id is not None:
+                op = dict(op, userId=op.get('userId', default_user_id))
+            status, body, undo, message = operation(op if isinstance(op, dict) else None)
+            if status == 200:
+                results.append({"index": index, "success": True, result_key: body})
+                applied.append((undo, message, op))
+            else:
+                results.append({"index": index, "success": False, "status": status, "error": body})
+    except Exception:
+        if all_or_nothing:
+            for undo, _, _ in reversed(applied):
+                undo()
+        raise
+    
+    failed = len(results) - len(applied)
+    if failed and all_or_nothing:
+        # Undo in reverse order, so items touched twice end up where they started
+        for undo, _, _ in reversed(applied):
+            undo()
+        for result in results:
+            if result["success"]:
+                result["success"] = False
+                result["rolledBack"] = True
+        log_action(action, f"Batch of {len(results)} operations rolled back, {failed} failed",
+                   user_id=default_user_id)
+        return jsonify({
+            "success": False,
+            "error": f"{failed} of {len(results)} operations failed, nothing was applied",
+            "applied": 0,
+            "failed": failed,
+            "results": results
+        }), 409
+    
+    for _, message, op in applied:
+        log_action(action, message, item_id=op['itemId'], user_id=op.get('userId'))
+    
+    return jsonify({
+        "success": True,
+        "applied": len(applied),
+        "failed": failed,
+        "results": results
+    }), 200
+
 # 3. Retrieve API
 @app.route('/api/retrieve', methods=['POST'])
 def retrieve():
     try:
         data = request.json
+        status, body, _, message = retrieve_operation(data)
+        if status != 200:
+            return jsonify({"success": False, "error": body}), status
         
-        if not data or 'itemId' not in data:
-            return jsonify({
-                "success": False,
-                "error": "Missing required field: itemId"
-            }), 400
-            
-        item_id = data['itemId']
+        log_action("RETRIEVE", message, item_id=data['itemId'], user_id=data.get('userId'))
         
-        # Check if item exists
-        if item_id not in items:
-            return jsonify({
-                "success": False,
-                "error": f"Item {item_id} not found"
-            }), 404
-            
-        # Check if item is in a container
-        if items[item_id]['containerId'] is None:
-            return jsonify({
-                "success": False,
-                "error": f"Item {item_id} is not in a container"
-            }), 400
-            
-        # Get container information
-        container_id = items[item_id]['containerId']
-        position = items[item_id]['position']
+        return jsonify({
+            "success": True,
+            "retrieval": body
+        }), 200
         
-        # Remove item from container
-        items[item_id]['containerId'] = None
-        items[item_id]['position'] = None
+    except Exception as e:
+        log_action("ERROR", f"Retrieve API error: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/retrieve/plan', methods=['GET'])
+def retrieve_plan():
+    try:
+        item_id = request.args.get('itemId')
+        if not item_id:
+            return jsonify({"success": False, "error": "Missing required parameter: itemId"}), 400
+        
+        # Check if item exists and is in a container
+        item = items.get(item_id)
+        if item is None:
+            return jsonify({"success": False, "error": f"Item {item_id} not found"}), 404
+        if item.get('containerId') is None:
+            return jsonify({"success": False, "error": f"Item {item_id} is not in a container"}), 400
         
-        log_action("RETRIEVE", f"Item {item_id} retrieved from container {container_id}")
+        steps = retrieval_steps(item_id, container_id=item['containerId'])
         
         return jsonify({
             "success": True,
-            "retrieval": {
-                "itemId": item_id,
-                "containerId": container_id,
-                "position": position
-            }
+            "itemId": item_id,
+            "containerId": item['containerId'],
+            "retrievalSteps": steps
         }), 200
         
     except Exception as e:
-        log_action("ERROR", f"Retrieve API error: {str(e)}")
+        log_action("ERROR", f"Retrieve plan API error: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/retrieve/batch', methods=['POST'])
+def retrieve_batch():
+    try:
+        return run_batch(retrieve_operation, "RETRIEVE", "retrieval")
+    except Exception as e:
+        log_action("ERROR", f"Retrieve batch API error: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 # 4. Place API (advanced placement)
@@ -224,106 +878,223 @@ def retrieve():
 def place():
     try:
         data = request.json
+        status, body, _, message = place_operation(data)
+        if status != 200:
+            return jsonify({"success": False, "error": body}), status
         
-        if not data or 'itemId' not in data or 'containerId' not in data:
-            return jsonify({
-                "success": False,
-                "error": "Missing required fields: itemId, containerId"
-            }), 400
-            
-        item_id = data['itemId']
-        container_id = data['containerId']
-        coordinates = data.get('coordinates', [0, 0, 0])
-        
-        # Check if item exists
-        if item_id not in items:
-            return jsonify({
-                "success": False,
-                "error": f"Item {item_id} not found"
-            }), 404
-            
-        # Check if container exists
-        if container_id not in containers:
-            return jsonify({
-                "success": False,
-                "error": f"Container {container_id} not found"
-            }), 404
-            
-        # Get item information
-        item = items[item_id]
-        
-        # Calculate end coordinates based on item dimensions
-        end_coordinates = [
-            coordinates[0] + item.get('width', 1),
-            coordinates[1] + item.get('depth', 1),
-            coordinates[2] + item.get('height', 1)
-        ]
-        
-        # Place item in container
-        item['containerId'] = container_id
-        item['position'] = {
-            "startCoordinates": coordinates,
-            "endCoordinates": end_coordinates
-        }
-        
-        log_action("PLACE", f"Item {item_id} placed in container {container_id} at {coordinates}")
+        log_action("PLACE", message, item_id=data['itemId'], user_id=data.get('userId'))
         
         return jsonify({
             "success": True,
-            "placement": {
-                "itemId": item_id,
-                "containerId": container_id,
-                "position": item['position']
-            }
+            "placement": body
         }), 200
         
     except Exception as e:
         log_action("ERROR", f"Place API error: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/api/place/batch', methods=['POST'])
+def place_batch():
+    try:
+        return run_batch(place_operation, "PLACE", "placement")
+    except Exception as e:
+        log_action("ERROR", f"Place batch API error: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
 # 5. Waste Management API
 @app.route('/api/waste', methods=['POST'])
 def waste_management():
+    try:
+        data = request.json
+        status, body, _, message = waste_operation(data)
+        if status != 200:
+            return jsonify({"success": False, "error": body}), status
+        
+        log_action("WASTE", message, item_id=data['itemId'], user_id=data.get('userId'))
+        
+        return jsonify({
+            "success": True,
+            "wasteManagement": body
+        }), 200
+        
+    except Exception as e:
+        log_action("ERROR", f"Waste Management API error: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/waste/batch', methods=['POST'])
+def waste_batch():
+    try:
+        return run_batch(waste_operation, "WASTE", "wasteManagement")
+    except Exception as e:
+        log_action("ERROR", f"Waste Management batch API error: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/waste/return-plan', methods=['POST'])
+def waste_return_plan():
     try:
         data = request.json
         
-        if not data or 'itemId' not in data:
+        if not data or 'undockingContainerId' not in data or 'maxWeight' not in data:
             return jsonify({
                 "success": False,
-                "error": "Missing required field: itemId"
+                "error": "Missing required fields: undockingContainerId, maxWeight"
             }), 400
             
-        item_id = data['itemId']
+        undocking_id = data['undockingContainerId']
+        max_weight = data['maxWeight']
+        objective = data.get('objective', 'volume')
         
-        # Check if item exists
-        if item_id not in items:
-            return jsonify({
-                "success": False,
-                "error": f"Item {item_id} not found"
-            }), 404
-            
-        # Get container information if item is in a container
-        container_id = items[item_id]['containerId']
+        if undocking_id not in containers:
+            return jsonify({"success": False, "error": f"Container {undocking_id} not found"}), 404
+        if isinstance(max_weight, bool) or not isinstance(max_weight, (int, float)) or max_weight < 0:
+            return jsonify({"success": False, "error": "maxWeight must be a non-negative number"}), 400
+        if objective not in ('volume', 'value'):
+            return jsonify({"success": False, "error": "objective must be 'volume' or 'value'"}), 400
         
-        # Remove item from system
-        removed_item = items.pop(item_id)
+        # Waste already in the undocking module goes with it and uses up its mass
+        waste = [item for item in iter_records(items) if item.get('status') in WASTE_STATUSES]
+        loaded = [item for item in waste if item.get('containerId') == undocking_id]
+        remaining_weight = max_weight - sum(item.get('mass') or 0 for item in loaded)
         
-        log_action("WASTE", f"Item {item_id} removed from system" + 
-                   (f" and container {container_id}" if container_id else ""))
+        # Pick the waste clearing the most volume (or value) within the mass limit
+        candidates = []
+        for item in waste:
+            if item.get('containerId') == undocking_id:
+                continue
+            width, depth, height = item_dimensions(item)
+            value = width * depth * height if objective == 'volume' else item.get('value') or 0
+            candidates.append((item['itemId'], item.get('mass') or 0, value))
+        selected = select_items(candidates, remaining_weight) if remaining_weight >= 0 else []
         
+        # Then fit the chosen items into the undocking module, largest first;
+        # planning works on copies, so nothing moves until the plan is carried out
+        undocking_space = container_spaces[undocking_id].copy()
+        sources = {}
+        return_plan = []
+        steps = []
+        for item in sorted((items[item_id] for item_id in selected), key=packing_order):
+            item_id = item['itemId']
+            box = undocking_space.find(item_dimensions(item))
+            if box is None:
+                continue
+            undocking_space.add(item_id, box)
+            
+            from_id = item.get('containerId')
+            if from_id in container_spaces and from_id not in sources:
+                sources[from_id] = container_spaces[from_id].copy()
+            for step in retrieval_steps(item_id, sources):
+                step["step"] = len(steps) + 1
+                steps.append(step)
+            if from_id in sources:
+                sources[from_id].remove(item_id)
+            
+            return_plan.append({
+                "step": len(return_plan) + 1,
+                "itemId": item_id,
+                "itemName": item.get('name'),
+                "fromContainer": from_id,
+                "toContainer": undocking_id,
+                "position": box_to_position(box)
+            })
+            loaded.append(item)
+        
+        planned = {item['itemId'] for item in loaded}
         return jsonify({
             "success": True,
-            "wasteManagement": {
-                "itemId": item_id,
-                "containerId": container_id,
-                "status": "removed"
-            }
+            "returnPlan": return_plan,
+            "retrievalSteps": steps,
+            "returnManifest": {
+                "undockingContainerId": undocking_id,
+                "undockingDate": data.get('undockingDate'),
+                "returnItems": [
+                    {"itemId": item['itemId'], "name": item.get('name'), "reason": item.get('status')}
+                    for item in loaded
+                ],
+                "totalVolume": sum(width * depth * height for width, depth, height in map(item_dimensions, loaded)),
+                "totalWeight": sum(item.get('mass') or 0 for item in loaded)
+            },
+            "leftBehind": [item['itemId'] for item in waste if item['itemId'] not in planned]
         }), 200
         
     except Exception as e:
-        log_action("ERROR", f"Waste Management API error: {str(e)}")
+        log_action("ERROR", f"Waste return plan API error: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+# Helper function to fast-forward the clock by whole days. Each scheduled item
+# gets its depletion day computed directly and expiries come off the queue, so
+# the cost follows the number of events rather than days times items.
+def fast_forward_days(days, usages):
+    global current_time
+    start = current_time
+    end = start + days * DAY
+    waste_by_day = {}
+    
+    # Count how many times each item is used per day
+    uses_per_day = {}
+    unknown_items = []
+    for usage in usages:
+        item_id = usage.get('itemId')
+        if item_id not in items:
+            unknown_items.append(item_id)
+        elif items[item_id].get('status') not in WASTE_STATUSES:
+            uses_per_day[item_id] = uses_per_day.get(item_id, 0) + 1
+    
+    items_used = []
+    for item_id, per_day in uses_per_day.items():
+        item = items[item_id]
+        remaining = item.get('remainingUses', item.get('usageLimit'))
+        days_used, depletion_day = usage_outcome(start, days, per_day, remaining,
+                                                 expiry_queue.expiry_of(item_id))
+        consumed = per_day * days_used
+        if remaining is not None:
+            consumed = min(consumed, remaining)
+            item = update_item(item_id, remainingUses=remaining - consumed)
+        items_used.append({
+            "itemId": item_id,
+            "usesConsumed": consumed,
+            "remainingUses": item.get('remainingUses')
+        })
+        if depletion_day is not None:
+            update_item(item_id, status='depleted')
+            expiry_queue.cancel(item_id)
+            waste_by_day.setdefault(depletion_day, []).append({"itemId": item_id, "reason": "depleted"})
+    
+    for item_id, expiry in expiry_queue.pop_expired(end):
+        update_item(item_id, status='expired')
+        waste_by_day.setdefault(expiry_day(start, expiry), []).append({"itemId": item_id, "reason": "expired"})
+    
+    current_time = end
+    journal({"op": "time", "currentTime": current_time.isoformat()})
+    
+    # Only days on which something became waste are reported
+    waste_days = []
+    affected_items = []
+    for day in sorted(waste_by_day):
+        waste_days.append({
+            "day": day,
+            "date": (start + (day - 1) * DAY).isoformat(),
+            "items": waste_by_day[day]
+        })
+        for entry in waste_by_day[day]:
+            affected_items.append({
+                "itemId": entry["itemId"],
+                "status": items[entry["itemId"]]['status'],
+                "action": "marked"
+            })
+    
+    log_action("TIME", f"Time advanced by {days} days to {current_time.isoformat()}, "
+                       f"{len(affected_items)} items became waste")
+    
+    return {
+        "currentTime": current_time.isoformat(),
+        "daysAdvanced": days,
+        "hoursAdvanced": days * 24,
+        "itemsUsed": items_used,
+        "wasteByDay": waste_days,
+        "affectedItems": affected_items,
+        "unknownItems": unknown_items
+    }
+
 # 6. Time Simulation API
 @app.route('/api/time', methods=['POST'])
 def time_simulation():
@@ -331,31 +1102,48 @@ def time_simulation():
         global current_time
         data = request.json
         
-        if not data or 'hours' not in data:
+        if not data or ('hours' not in data and 'numOfDays' not in data):
             return jsonify({
                 "success": False,
-                "error": "Missing required field: hours"
+                "error": "Missing required field: hours or numOfDays"
             }), 400
+        
+        # Multi-day fast-forward with a daily usage schedule
+        if 'numOfDays' in data:
+            days = data['numOfDays']
+            usages = data.get('itemsToBeUsedPerDay', [])
+            if not isinstance(days, int) or isinstance(days, bool) or days < 1:
+                return jsonify({
+                    "success": False,
+                    "error": "numOfDays must be a positive integer"
+                }), 400
+            if not isinstance(usages, list) or not all(isinstance(usage, dict) for usage in usages):
+                return jsonify({
+                    "success": False,
+                    "error": "itemsToBeUsedPerDay must be a list of objects with an itemId"
+                }), 400
+                
+            return jsonify({
+                "success": True,
+                "timeSimulation": fast_forward_days(days, usages)
+            }), 200
             
         hours = data['hours']
         
         # Advance time
         current_time += timedelta(hours=hours)
+        journal({"op": "time", "currentTime": current_time.isoformat()})
         
-        # Simulate time effects on items (e.g., perishable items)
+        # Simulate time effects on items: only perishables whose expiry was
+        # crossed come out of the queue, each of them exactly once
         affected_items = []
-        for item_id, item in list(items.items()):
-            # Example: If an item is perishable and its expiry is passed, handle it
-            if item.get('perishable') and item.get('expiryDate'):
-                expiry_date = datetime.fromisoformat(item['expiryDate'])
-                if current_time > expiry_date:
-                    # Mark item as expired
-                    item['status'] = 'expired'
-                    affected_items.append({
-                        "itemId": item_id,
-                        "status": "expired",
-                        "action": "marked"
-                    })
+        for item_id, _ in expiry_queue.pop_expired(current_time):
+            update_item(item_id, status='expired')
+            affected_items.append({
+                "itemId": item_id,
+                "status": "expired",
+                "action": "marked"
+            })
         
         log_action("TIME", f"Time advanced by {hours} hours to {current_time.isoformat()}")
         
@@ -372,11 +1160,83 @@ def time_simulation():
         log_action("ERROR", f"Time Simulation API error: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+# Helper functions for streamed CSV / NDJSON imports
+def bulk_upload():
+    """Return (format, binary stream) for a CSV or NDJSON upload, or None for a JSON body."""
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if upload is None:
+            return None
+        filename = (upload.filename or '').lower()
+        if filename.endswith('.csv') or upload.mimetype in CSV_MIMETYPES:
+            return 'csv', upload.stream
+        if filename.endswith(('.ndjson', '.jsonl')) or upload.mimetype in NDJSON_MIMETYPES:
+            return 'ndjson', upload.stream
+        return 'unknown', None
+    if request.mimetype in CSV_MIMETYPES:
+        return 'csv', request.stream
+    if request.mimetype in NDJSON_MIMETYPES:
+        return 'ndjson', request.stream
+    return None
+
+def import_chunk(chunk, counts, errors):
+    for row_number, kind, record, error in chunk:
+        if error:
+            counts['rejected'] += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"row": row_number, "error": error})
+        elif kind == 'containers':
+            register_container(record)
+            counts['containers'] += 1
+        else:
+            register_item(record)
+            counts['items'] += 1
+
+def import_stream(upload_format, stream):
+    kind = request.args.get('type')
+    if kind not in ('items', 'containers'):
+        kind = None
+    rows = iter_csv_rows(stream, kind) if upload_format == 'csv' else iter_ndjson_rows(stream, kind)
+    
+    # Rows are parsed lazily and applied a chunk at a time
+    counts = {'items': 0, 'containers': 0, 'rejected': 0}
+    errors = []
+    for chunk in chunked(rows):
+        import_chunk(chunk, counts, errors)
+    
+    log_action("IMPORT", f"Imported {counts['containers']} containers and {counts['items']} items "
+                         f"from {upload_format} upload, {counts['rejected']} rows rejected")
+    
+    return jsonify({
+        "success": True,
+        "import": {
+            "format": upload_format,
+            "containersImported": counts['containers'],
+            "itemsImported": counts['items'],
+            "rowsRejected": counts['rejected'],
+            "errors": errors,
+            "totalContainers": len(containers),
+            "totalItems": len(items)
+        }
+    }), 200
+
 # 7. Import API
 @app.route('/api/import', methods=['POST'])
 def import_data():
     try:
         global containers, items
+        
+        # CSV and NDJSON uploads are streamed instead of parsed as one document
+        upload = bulk_upload()
+        if upload is not None:
+            upload_format, stream = upload
+            if stream is None:
+                return jsonify({
+                    "success": False,
+                    "error": "Unsupported upload format, use a .csv or .ndjson file"
+                }), 400
+            return import_stream(upload_format, stream)
+            
         data = request.json
         
         if not data:
@@ -389,13 +1249,13 @@ def import_data():
         if 'containers' in data:
             for container in data['containers']:
                 if 'containerId' in container:
-                    containers[container['containerId']] = container
+                    register_container(container)
         
         # Import items
         if 'items' in data:
             for item in data['items']:
                 if 'itemId' in item:
-                    items[item['itemId']] = item
+                    register_item(item)
         
         total_containers = len(containers)
         total_items = len(items)
@@ -416,11 +1276,67 @@ def import_data():
         log_action("ERROR", f"Import API error: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+# Helper functions for streamed exports
+def iter_record_pages(index, store, size=CHUNK_SIZE):
+    """Yield the records of store a page at a time, in insertion order.
+    
+    Pages are fetched from the search index by sequence number, so records
+    added or removed while the export is streaming do not break iteration.
+    """
+    after = None
+    while True:
+        matches = index.page('', None, after=after, limit=size)
+        if not matches:
+            return
+        after = matches[-1][0]
+        yield lookup_records(store, [key for _, key in matches])
+
+def export_stream(export_type, export_format):
+    if export_format == 'ndjson':
+        if export_type in ['all', 'containers']:
+            for page in iter_record_pages(container_search_index, containers):
+                yield ndjson_lines(page)
+        if export_type in ['all', 'items']:
+            for page in iter_record_pages(item_search_index, items):
+                yield ndjson_lines(page)
+    elif export_type == 'containers':
+        yield csv_lines([CONTAINER_HEADER])
+        for page in iter_record_pages(container_search_index, containers):
+            yield csv_lines(container_rows(page))
+    else:
+        # The CSV arrangement lists where every placed item sits
+        yield csv_lines([ARRANGEMENT_HEADER])
+        for page in iter_record_pages(item_search_index, items):
+            yield csv_lines(arrangement_rows(page))
+
 # 8. Export API
 @app.route('/api/export', methods=['GET'])
+@versioned_response(export_collections)
 def export_data():
     try:
         export_type = request.args.get('type', 'all')
+        export_format = request.args.get('format', 'json')
+        
+        # CSV and NDJSON exports are streamed chunk by chunk
+        if export_format in ['csv', 'ndjson']:
+            log_action("EXPORT", f"Streaming export of type: {export_type} as {export_format}")
+            if export_format == 'csv':
+                mimetype = 'text/csv'
+                filename = 'containers.csv' if export_type == 'containers' else 'arrangement.csv'
+            else:
+                mimetype = 'application/x-ndjson'
+                filename = f"{export_type}.ndjson"
+            return Response(
+                stream_with_context(export_stream(export_type, export_format)),
+                mimetype=mimetype,
+                headers={"Content-Disposition": f"attachment; filename={filename}"}
+            )
+            
+        if export_format != 'json':
+            return jsonify({
+                "success": False,
+                "error": f"Unsupported export format: {export_format}"
+            }), 400
         
         export_data = {}
         
@@ -447,6 +1363,8 @@ def logs():
     try:
         # Get optional filter parameters
         action_filter = request.args.get('action')
+        item_filter = request.args.get('itemId')
+        user_filter = request.args.get('userId')
         limit = request.args.get('limit')
         
         if limit:
@@ -455,15 +1373,27 @@ def logs():
             except ValueError:
                 limit = None
         
-        # Apply filters
-        filtered_logs = system_logs
+        # Optional time range, inclusive at both ends
+        start_date = request.args.get('startDate')
+        end_date = request.args.get('endDate')
+        if start_date:
+            start_date = parse_timestamp(start_date)
+            if start_date is None:
+                return jsonify({"success": False, "error": "Invalid startDate"}), 400
+        if end_date:
+            end_date = parse_timestamp(end_date)
+            if end_date is None:
+                return jsonify({"success": False, "error": "Invalid endDate"}), 400
         
-        if action_filter:
-            filtered_logs = [log for log in filtered_logs if log['action'] == action_filter]
-            
-        # Apply limit
-        if limit:
-            filtered_logs = filtered_logs[-limit:]
+        # Apply filters through the log store indexes
+        filtered_logs = system_logs.query(
+            action=action_filter,
+            item_id=item_filter,
+            user_id=user_filter,
+            start=start_date or None,
+            end=end_date or None,
+            limit=limit
+        )
         
         return jsonify({
             "success": True,
@@ -474,6 +1404,252 @@ def logs():
         logger.error(f"Logs API error: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+# 10. Version API
+@app.route('/api/version', methods=['GET'])
+def state_versions():
+    with versions_lock:
+        return jsonify({
+            "success": True,
+            "version": state_version,
+            "collections": dict(collection_versions)
+        }), 200
+
+# 11. Change Feed API
+@app.route('/api/changes', methods=['GET'])
+def changes():
+    try:
+        try:
+            since = int(request.args.get('since', 0))
+        except ValueError:
+            since = -1
+        if since < 0:
+            return jsonify({"success": False, "error": "since must be a non-negative integer"}), 400
+        try:
+            limit = int(request.args.get('limit', 1000))
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return jsonify({"success": False, "error": "limit must be a positive integer"}), 400
+        
+        if isinstance(state_store, SQLiteStore):
+            feed_id, feed, current_seq = state_store.feed_id, state_store.changes_since, state_store.last_seq
+        else:
+            feed_id, feed, current_seq = INSTANCE_ID, change_feed.since, change_feed.seq
+        
+        # A mirror of another feed, or one too far behind, starts over: it
+        # should note `next`, then export everything and follow from there
+        found = feed(since, limit) if request.args.get('feedId') in (None, feed_id) else None
+        if found is None:
+            return jsonify({
+                "success": False,
+                "error": "Changes since this point are no longer available, a full export is needed",
+                "resync": True,
+                "feedId": feed_id,
+                "next": current_seq
+            }), 410
+        
+        found, next_seq, has_more = found
+        results = []
+        for seq, collection, key, removed in found:
+            store = items if collection == "items" else containers
+            record = None if removed else store.get(key)
+            results.append({
+                "seq": seq,
+                "type": "item" if collection == "items" else "container",
+                "id": key,
+                "action": "upsert" if record is not None else "remove",
+                "record": record
+            })
+        
+        return jsonify({
+            "success": True,
+            "feedId": feed_id,
+            "since": since,
+            "next": next_seq,
+            "hasMore": has_more,
+            "currentTime": current_time.isoformat(),
+            "changes": results
+        }), 200
+        
+    except Exception as e:
+        log_action("ERROR", f"Change feed API error: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# 12. Metrics API (Prometheus text format)
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+# Helper functions for request metrics and slow-request profiling. These
+# hooks are registered first, so the time spent waiting for the state lock
+# and storing changes is included. Streamed responses are timed until their
+# first chunk is ready.
+def request_route():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    if PROFILE_SLOW_MS is not None:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Only one profiler can run at a time on newer Pythons
+            return
+        g.profiler = profiler
+
+@app.after_request
+def record_request_metrics(response):
+    route = request_route()
+    request_count.inc(route, request.method, str(response.status_code))
+    request_duration.observe(time.perf_counter() - g.request_started, route, request.method)
+    request_size.observe(request.content_length or 0, route, request.method)
+    if not response.is_streamed:
+        response_size.observe(response.content_length or 0, route, request.method)
+    return response
+
+@app.teardown_request
+def finish_request_profile(exception):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return
+    profiler.disable()
+    elapsed_ms = (time.perf_counter() - g.request_started) * 1000
+    if elapsed_ms < PROFILE_SLOW_MS:
+        return
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    route = re.sub(r'[^A-Za-z0-9]+', '_', request_route()).strip('_')
+    path = os.path.join(PROFILE_DIR, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{request.method}-{route}.prof")
+    profiler.dump_stats(path)
+    logger.warning(f"Slow request {request.method} {request.path} took {elapsed_ms:.0f}ms, profile saved to {path}")
+
+# Helper functions for durable and shared state
+@app.before_request
+def begin_request():
+    write = request.method == 'POST'
+    if write:
+        state_lock.acquire()
+        g.holds_state_lock = True
+        start_write()
+    state_store.begin(write=write)
+    # Catch up with changes other worker processes made since the last
+    # request. The changes are taken and applied under state_lock, so no
+    # write request of this process can run in between
+    if state_store.behind():
+        with state_lock:
+            ops = state_store.catch_up()
+            if ops:
+                start_write()
+                try:
+                    apply_ops(ops)
+                    publish_changes()
+                finally:
+                    finish_write()
+
+@app.after_request
+def commit_request(response):
+    # Everything a request changed is stored before its response is sent
+    state_store.commit(iter_state_ops)
+    return response
+
+@app.teardown_request
+def end_request(exception):
+    state_store.rollback()
+    publish_changes()
+    if g.pop('holds_state_lock', False):
+        finish_write()
+        state_lock.release()
+
+def iter_state_ops():
+    # Runs on the snapshot thread: the dicts are listed in one step and
+    # records are never changed in place, so concurrent requests are harmless
+    yield {"op": "time", "currentTime": current_time.isoformat()}
+    for container in list(containers.values()):
+        yield {"op": "container", "record": container}
+    for item in iter_records(items):
+        yield {"op": "item", "record": item}
+
+def apply_ops(ops):
+    """Apply operations committed by another process, one at a time."""
+    global current_time
+    replaying.active = True
+    try:
+        for op in ops:
+            if op['op'] == 'container':
+                register_container(op['record'])
+            elif op['op'] == 'item':
+                register_item(op['record'])
+            elif op['op'] == 'remove':
+                if op['itemId'] in items:
+                    unregister_item(op['itemId'])
+            elif op['op'] == 'time':
+                current_time = datetime.fromisoformat(op['currentTime'])
+            elif op['op'] == 'reset':
+                for item_id in list(items):
+                    unregister_item(item_id)
+                for container_id in list(containers):
+                    unregister_container(container_id)
+    finally:
+        replaying.active = False
+
+def recover_state(store):
+    """Load the stored state from store, then rebuild the indexes in bulk."""
+    # Loading only allocates, so cyclic collections would just rescan the
+    # growing state; afterwards it is frozen out of later collections
+    gc.disable()
+    try:
+        return load_state(store)
+    finally:
+        gc.freeze()
+        gc.enable()
+
+def load_state(store):
+    global current_time
+    recovered_containers = {}
+    recovered_items = {}
+    for op in store.recover():
+        if op['op'] == 'container':
+            recovered_containers[op['record']['containerId']] = op['record']
+        elif op['op'] == 'item':
+            recovered_items[op['record']['itemId']] = op['record']
+        elif op['op'] == 'remove':
+            recovered_items.pop(op['itemId'], None)
+        elif op['op'] == 'time':
+            current_time = datetime.fromisoformat(op['currentTime'])
+    
+    # Only the final version of each record is indexed; search grams are
+    # built in the background instead of holding up startup, and box grids
+    # and free space when a container is first packed or searched
+    replaying.active = True
+    try:
+        for container in recovered_containers.values():
+            register_container(container)
+        for item in recovered_items.values():
+            register_item(item, bulk=True)
+    finally:
+        replaying.active = False
+    for container_id in container_spaces:
+        refresh_zone_index(container_id)
+    item_search_index.start_catch_up()
+    return len(recovered_containers), len(recovered_items)
+
+# Placement workers import a script's main module again, as __mp_main__;
+# only the server itself opens the storage
+if __name__ != '__mp_main__':
+    if STORAGE_BACKEND == 'wal':
+        state_store = WriteAheadLog(DATA_DIR or 'data', snapshot_every=SNAPSHOT_EVERY,
+                                    fsync=os.environ.get('WAL_FSYNC') == '1')
+    elif STORAGE_BACKEND == 'sqlite':
+        state_store = SQLiteStore(SQLITE_PATH)
+    elif STORAGE_BACKEND != 'memory':
+        raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+    recovered = recover_state(state_store)
+    publish_changes()
+    if STORAGE_BACKEND != 'memory':
+        logger.info(f"Recovered {recovered[0]} containers and {recovered[1]} items "
+                    f"from {STORAGE_BACKEND} storage")
+
 # Run the application
 if __name__ == '__main__':
     log_action("STARTUP", "Space Station Cargo Management System starting up")
@@ -0,0 +1,115 @@
+#audit.py
+"""Asynchronous audit log output.
+
+Request handlers only put entries on a queue. A background thread drains the
+queue in batches, formats the whole batch through the logger's handlers with a
+single write and flush per stream, and optionally appends the entries as JSON
+lines to a durable audit file. Request latency therefore never includes log
+I/O, however many entries a request produces.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _handlers_for(logger):
+    """The handlers a record logged on logger would reach, like Logger.callHandlers."""
+    handlers = []
+    current = logger
+    while current:
+        handlers.extend(current.handlers)
+        if not current.propagate:
+            break
+        current = current.parent
+    return handlers
+
+
+class AuditLog:
+    def __init__(self, logger, path=None, fsync=False, batch_size=DEFAULT_BATCH_SIZE):
+        self.logger = logger
+        self.path = path
+        self.fsync = fsync
+        self.batch_size = batch_size
+        self.queue = queue.SimpleQueue()
+        self.file = open(path, 'a', encoding='utf-8') if path else None
+        self.thread = threading.Thread(target=self._run, name='audit-log', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def submit(self, entry, moment):
+        """Queue an entry logged at datetime moment; never blocks."""
+        self.queue.put((entry, moment))
+
+    def flush(self, timeout=None):
+        """Block until everything submitted so far has been written."""
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout=5)
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            entries = [item for item in batch if isinstance(item, tuple)]
+            if entries:
+                try:
+                    self._write(entries)
+                except Exception:
+                    # Losing audit output must never take the writer thread down
+                    logging.getLogger(__name__).exception("Audit log write failed")
+
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if None in batch:
+                return
+
+    def _write(self, entries):
+        if self.logger.isEnabledFor(logging.INFO):
+            records = []
+            for entry, moment in entries:
+                record = self.logger.makeRecord(
+                    self.logger.name, logging.INFO, __file__, 0,
+                    f"{entry['action']}: {entry['details']}", None, None
+                )
+                # Stamp the record with the time of the action, not of the write
+                record.created = moment.timestamp()
+                record.msecs = (record.created - int(record.created)) * 1000
+                records.append(record)
+
+            for handler in _handlers_for(self.logger):
+                handler_records = [r for r in records if r.levelno >= handler.level]
+                if not handler_records:
+                    continue
+                if isinstance(handler, logging.StreamHandler):
+                    text = ''.join(handler.format(r) + handler.terminator for r in handler_records)
+                    with handler.lock:
+                        handler.stream.write(text)
+                        handler.flush()
+                else:
+                    for record in handler_records:
+                        handler.handle(record)
+
+        if self.file:
+            self.file.write(''.join(json.dumps(entry, default=str) + '\n' for entry, _ in entries))
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
@@ -0,0 +1,433 @@
+#bench.py
+"""Load test and benchmark harness for the cargo API.
+
+Builds a synthetic station (containers spread over zones, items with random
+sizes, priorities, masses and expiry dates), loads it with one placement
+request, then drives every endpoint for a number of operations from several
+threads and reports throughput and p50/p95/p99 latency per endpoint.
+
+Requests go either through the Flask test client in this process (the
+default, no server needed) or over HTTP to a running server:
+
+    python benchmarks/bench.py --items 20000 --containers 400
+    python benchmarks/bench.py --url http://localhost:8000 --concurrency 8
+
+``--output results.json`` saves the figures and ``--baseline results.json``
+compares a run against saved ones, exiting with status 1 when an endpoint's
+p95 latency got worse by more than ``--tolerance``. Benchmark a fresh server:
+the run adds items, moves them around and advances the simulated clock.
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NAME_WORDS = ['Food', 'Water', 'Oxygen', 'Filter', 'Medical', 'Kit', 'Battery', 'Cable',
+              'Tool', 'Sample', 'Pump', 'Spare', 'Ration', 'Sensor', 'Suit', 'Canister']
+PERCENTILES = (50, 95, 99)
+
+
+# Synthetic station
+
+def make_station(containers, items, zones, perishable, expiry_days, distribution, seed):
+    """Containers and items for a station; expiry dates start at today's midnight."""
+    rng = random.Random(seed)
+    zone_names = [f"Zone{zone}" for zone in range(zones)]
+    station = {"containers": [], "items": []}
+    for number in range(containers):
+        station["containers"].append({
+            "containerId": f"bench-c{number}",
+            "zone": zone_names[number % zones],
+            "width": rng.choice([100, 150, 200]),
+            "depth": rng.choice([85, 100]),
+            "height": 200
+        })
+
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    for number in range(items):
+        item = {
+            "itemId": f"bench-i{number}",
+            "name": f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_WORDS)} {number}",
+            "width": rng.randint(5, 40),
+            "depth": rng.randint(5, 40),
+            "height": rng.randint(5, 40),
+            "mass": round(rng.uniform(0.5, 50), 1),
+            "priority": rng.randint(1, 100),
+            "usageLimit": rng.randint(1, 50),
+            "preferredZone": rng.choice(zone_names)
+        }
+        if rng.random() < perishable:
+            if distribution == 'exponential':
+                days = min(rng.expovariate(3 / expiry_days), expiry_days)
+            else:
+                days = rng.uniform(0, expiry_days)
+            item["perishable"] = True
+            item["expiryDate"] = (start + timedelta(days=days)).isoformat()
+        station["items"].append(item)
+    return station
+
+
+# Clients
+
+class InProcessClient:
+    """Calls the app through Flask test clients, one per thread."""
+
+    def __init__(self):
+        sys.path.insert(0, ROOT)
+        import app
+        # Keep the per-action log lines out of the report
+        logging.getLogger(app.__name__).setLevel(logging.WARNING)
+        self.app = app.app
+        self.local = threading.local()
+
+    def request(self, method, path, params=None, body=None, data=None, content_type=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        if data is None:
+            response = client.open(path, method=method, query_string=params, json=body)
+        else:
+            response = client.open(path, method=method, query_string=params, data=data,
+                                   content_type=content_type)
+        # Reading the body also drains streamed exports
+        return response.status_code, response.get_data()
+
+
+class HttpClient:
+    """Calls a running server, one connection-pooling session per thread."""
+
+    def __init__(self, url):
+        import requests
+        self.requests = requests
+        self.url = url.rstrip('/')
+        self.local = threading.local()
+
+    def request(self, method, path, params=None, body=None, data=None, content_type=None):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = self.requests.Session()
+        headers = {"Content-Type": content_type} if content_type else None
+        response = session.request(method, self.url + path, params=params, json=body,
+                                   data=data, headers=headers)
+        return response.status_code, response.content
+
+
+# Scenarios: each one runs one operation and returns a list of
+# (endpoint, seconds, status code, response bytes)
+
+def timed(client, endpoint, method, path, params=None, body=None, data=None, content_type=None):
+    started = time.perf_counter()
+    status, content = client.request(method, path, params, body, data, content_type)
+    return endpoint, time.perf_counter() - started, status, len(content)
+
+
+class Scenarios:
+    def __init__(self, client, station, placements, seed):
+        self.client = client
+        self.station = station
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.counter = itertools.count()
+        self.zones = sorted({container["zone"] for container in station["containers"]})
+        # Placed items are handed out to one operation at a time, so
+        # concurrent retrieve/place cycles never fight over an item. The
+        # place API does not rotate, so only unrotated items can go back
+        sizes = {item["itemId"]: [item["width"], item["depth"], item["height"]] for item in station["items"]}
+        self.placed = [
+            (item_id, (container_id, position)) for item_id, (container_id, position) in placements.items()
+            if [end - start for start, end in zip(position["startCoordinates"], position["endCoordinates"])]
+            == sizes.get(item_id)
+        ]
+        self.placed_lock = threading.Lock()
+
+    def choice(self, options):
+        with self.rng_lock:
+            return self.rng.choice(options)
+
+    def take_placed(self):
+        with self.placed_lock:
+            if not self.placed:
+                return None
+            return self.placed.pop(self.rng.randrange(len(self.placed)))
+
+    def give_back(self, entry):
+        with self.placed_lock:
+            self.placed.append(entry)
+
+    def take_placed_many(self, count):
+        entries = []
+        for _ in range(count):
+            entry = self.take_placed()
+            if entry is None:
+                break
+            entries.append(entry)
+        return entries
+
+    def new_items(self, count):
+        items = []
+        for _ in range(count):
+            number = next(self.counter)
+            items.append({"itemId": f"bench-n{number}", "name": f"New Item {number}",
+                          "width": 10, "depth": 10, "height": 10, "priority": 50,
+                          "preferredZone": self.choice(self.zones)})
+        return items
+
+    def spare_items(self, count):
+        """Ids of count new unplaced items, imported without timing it."""
+        items = self.new_items(count)
+        self.client.request('POST', '/api/import', body={"items": items})
+        return [item["itemId"] for item in items]
+
+    def placement(self):
+        return [timed(self.client, 'placement', 'POST', '/api/placement', body={"items": self.new_items(20)})]
+
+    def search(self):
+        params = {"query": self.choice(NAME_WORDS).lower(), "limit": 50}
+        return [timed(self.client, 'search', 'GET', '/api/search', params)]
+
+    def search_zone(self):
+        params = {"type": "item", "zone": self.choice(self.zones), "limit": 50}
+        return [timed(self.client, 'search-zone', 'GET', '/api/search', params)]
+
+    def retrieve_plan(self):
+        entry = self.take_placed()
+        if entry is None:
+            return []
+        try:
+            return [timed(self.client, 'retrieve-plan', 'GET', '/api/retrieve/plan', {"itemId": entry[0]})]
+        finally:
+            self.give_back(entry)
+
+    def retrieve_place(self):
+        entry = self.take_placed()
+        if entry is None:
+            return []
+        item_id, (container_id, position) = entry
+        try:
+            return [
+                timed(self.client, 'retrieve', 'POST', '/api/retrieve', body={"itemId": item_id}),
+                timed(self.client, 'place', 'POST', '/api/place', body={
+                    "itemId": item_id, "containerId": container_id,
+                    "coordinates": position["startCoordinates"]
+                })
+            ]
+        finally:
+            self.give_back(entry)
+
+    def retrieve_place_batch(self):
+        entries = self.take_placed_many(10)
+        if not entries:
+            return []
+        try:
+            retrievals = [{"itemId": item_id} for item_id, _ in entries]
+            placements = [{"itemId": item_id, "containerId": container_id,
+                           "coordinates": position["startCoordinates"]}
+                          for item_id, (container_id, position) in entries]
+            return [
+                timed(self.client, 'retrieve-batch', 'POST', '/api/retrieve/batch',
+                      body={"operations": retrievals}),
+                timed(self.client, 'place-batch', 'POST', '/api/place/batch',
+                      body={"operations": placements})
+            ]
+        finally:
+            for entry in entries:
+                self.give_back(entry)
+
+    def waste(self):
+        item_id, = self.spare_items(1)
+        return [timed(self.client, 'waste', 'POST', '/api/waste', body={"itemId": item_id})]
+
+    def waste_batch(self):
+        operations = [{"itemId": item_id} for item_id in self.spare_items(20)]
+        return [timed(self.client, 'waste-batch', 'POST', '/api/waste/batch', body={"operations": operations})]
+
+    def import_json(self):
+        return [timed(self.client, 'import-json', 'POST', '/api/import', body={"items": self.new_items(50)})]
+
+    def import_csv(self):
+        items = self.new_items(50)
+        text = io.StringIO()
+        writer = csv.DictWriter(text, fieldnames=list(items[0]))
+        writer.writeheader()
+        writer.writerows(items)
+        return [timed(self.client, 'import-csv', 'POST', '/api/import',
+                      data=text.getvalue().encode('utf-8'), content_type='text/csv')]
+
+    def import_ndjson(self):
+        lines = ''.join(json.dumps(item) + '\n' for item in self.new_items(50))
+        return [timed(self.client, 'import-ndjson', 'POST', '/api/import',
+                      data=lines.encode('utf-8'), content_type='application/x-ndjson')]
+
+    def export_json(self):
+        return [timed(self.client, 'export-json', 'GET', '/api/export', {"type": "items"})]
+
+    def export_csv(self):
+        return [timed(self.client, 'export-csv', 'GET', '/api/export', {"format": "csv"})]
+
+    def export_ndjson(self):
+        return [timed(self.client, 'export-ndjson', 'GET', '/api/export', {"format": "ndjson"})]
+
+    def logs(self):
+        return [timed(self.client, 'logs', 'GET', '/api/logs', {"limit": 100})]
+
+    def time(self):
+        return [timed(self.client, 'time', 'POST', '/api/time', body={"hours": 1})]
+
+    def waste_return_plan(self):
+        body = {"undockingContainerId": self.station["containers"][0]["containerId"], "maxWeight": 500}
+        return [timed(self.client, 'waste-return-plan', 'POST', '/api/waste/return-plan', body=body)]
+
+
+SCENARIOS = {
+    'placement': Scenarios.placement,
+    'search': Scenarios.search,
+    'search-zone': Scenarios.search_zone,
+    'retrieve-plan': Scenarios.retrieve_plan,
+    'retrieve-place': Scenarios.retrieve_place,
+    'retrieve-place-batch': Scenarios.retrieve_place_batch,
+    'waste': Scenarios.waste,
+    'waste-batch': Scenarios.waste_batch,
+    'import-json': Scenarios.import_json,
+    'import-csv': Scenarios.import_csv,
+    'import-ndjson': Scenarios.import_ndjson,
+    'export-json': Scenarios.export_json,
+    'export-csv': Scenarios.export_csv,
+    'export-ndjson': Scenarios.export_ndjson,
+    'logs': Scenarios.logs,
+    'time': Scenarios.time,
+    'waste-return-plan': Scenarios.waste_return_plan
+}
+
+
+# Measuring and reporting
+
+def percentile(ordered, percent):
+    """Nearest-rank percentile of an ascending list."""
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(samples, wall_time):
+    latencies = sorted(sample[1] for sample in samples)
+    summary = {
+        "requests": len(samples),
+        "errors": sum(1 for sample in samples if sample[2] >= 400),
+        "throughput": len(samples) / wall_time if wall_time > 0 else None,
+        "meanBytes": sum(sample[3] for sample in samples) / len(samples) if samples else 0
+    }
+    for percent in PERCENTILES:
+        value = percentile(latencies, percent)
+        summary[f"p{percent}Ms"] = None if value is None else value * 1000
+    return summary
+
+
+def run_scenario(scenarios, name, operations, concurrency):
+    """Run operations of one scenario on concurrency threads; returns {endpoint: summary}."""
+    operation = SCENARIOS[name]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        batches = list(pool.map(lambda _: operation(scenarios), range(operations)))
+    wall_time = time.perf_counter() - started
+
+    by_endpoint = {}
+    for batch in batches:
+        for sample in batch:
+            by_endpoint.setdefault(sample[0], []).append(sample)
+    return {endpoint: summarize(samples, wall_time) for endpoint, samples in by_endpoint.items()}
+
+
+def print_report(results):
+    columns = ("requests", "errors", "throughput", "p50Ms", "p95Ms", "p99Ms", "meanBytes")
+    print(f"{'endpoint':<20}" + ''.join(f"{column:>12}" for column in columns))
+    for endpoint, summary in results.items():
+        cells = []
+        for column in columns:
+            value = summary[column]
+            cells.append(f"{'-':>12}" if value is None else
+                         f"{value:>12.1f}" if isinstance(value, float) else f"{value:>12}")
+        print(f"{endpoint:<20}" + ''.join(cells))
+
+
+def regressions(results, baseline, tolerance):
+    """Endpoints whose p95 latency is worse than the baseline's by more than tolerance."""
+    slower = []
+    for endpoint, summary in results.items():
+        before = baseline.get(endpoint, {}).get("p95Ms")
+        after = summary.get("p95Ms")
+        if before and after and after > before * (1 + tolerance):
+            slower.append((endpoint, before, after))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', help="benchmark a running server instead of the app in this process")
+    parser.add_argument('--containers', type=int, default=200)
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--zones', type=int, default=8)
+    parser.add_argument('--perishable', type=float, default=0.3, help="fraction of items with an expiry date")
+    parser.add_argument('--expiry-days', type=float, default=90, help="expiry dates fall within this many days")
+    parser.add_argument('--expiry-distribution', choices=['uniform', 'exponential'], default='uniform')
+    parser.add_argument('--operations', type=int, default=200, help="operations per scenario")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help="comma-separated subset of: " + ', '.join(SCENARIOS))
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--baseline', help="compare against results saved with --output")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed p95 slowdown against the baseline (default 0.25)")
+    args = parser.parse_args(argv)
+
+    names = [name for name in args.scenarios.split(',') if name]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    client = HttpClient(args.url) if args.url else InProcessClient()
+    station = make_station(args.containers, args.items, args.zones, args.perishable,
+                           args.expiry_days, args.expiry_distribution, args.seed)
+
+    # Loading the station is itself the biggest placement there is
+    started = time.perf_counter()
+    status, content = client.request('POST', '/api/placement', body=station)
+    seconds = time.perf_counter() - started
+    if status != 200:
+        sys.exit(f"Loading the station failed with status {status}: {content[:200]!r}")
+    placements = {placement["itemId"]: (placement["containerId"], placement["position"])
+                  for placement in json.loads(content)["placements"]}
+    results = {'placement-load': summarize([('placement-load', seconds, status, len(content))], seconds)}
+    print(f"Loaded {len(station['containers'])} containers and {len(station['items'])} items, "
+          f"{len(placements)} placed, in {seconds:.2f}s")
+
+    scenarios = Scenarios(client, station, placements, args.seed)
+    for name in names:
+        results.update(run_scenario(scenarios, name, args.operations, args.concurrency))
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            slower = regressions(results, json.load(baseline_file), args.tolerance)
+        for endpoint, before, after in slower:
+            print(f"REGRESSION {endpoint}: p95 {before:.1f}ms -> {after:.1f}ms")
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
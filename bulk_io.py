@@ -0,0 +1,197 @@
+#bulk_io.py
+"""CSV and NDJSON parsing for bulk imports, and formatting for exports.
+
+Uploads are read row by row from the request stream and handed out in
+chunks, so a manifest of any size is imported with bounded memory. Every row
+is normalised into the same item/container dicts the JSON API uses; rows
+that fail validation are reported with their row number instead of aborting
+the whole import. Exports go the other way: each chunk of records is turned
+into one CSV or NDJSON string that can be sent as soon as it is ready.
+"""
+import csv
+import io
+import json
+import re
+
+from expiry import parse_timestamp
+
+CHUNK_SIZE = 1000
+
+# CSV headers are matched case-insensitively, ignoring spaces, punctuation
+# and units in parentheses, so "Width (cm)" and "width" are the same column
+FIELD_NAMES = {
+    'itemid': 'itemId',
+    'containerid': 'containerId',
+    'name': 'name',
+    'description': 'description',
+    'width': 'width',
+    'depth': 'depth',
+    'height': 'height',
+    'mass': 'mass',
+    'priority': 'priority',
+    'expirydate': 'expiryDate',
+    'usagelimit': 'usageLimit',
+    'preferredzone': 'preferredZone',
+    'zone': 'zone',
+    'perishable': 'perishable'
+}
+NUMERIC_FIELDS = ('width', 'depth', 'height', 'mass', 'priority', 'usageLimit')
+DIMENSION_FIELDS = ('width', 'depth', 'height')
+TRUE_VALUES = ('true', 'yes', 'y', '1')
+
+
+class RowError(ValueError):
+    pass
+
+
+def field_name(header):
+    key = re.sub(r'\(.*?\)|[^a-z0-9]', '', header.lower())
+    return FIELD_NAMES.get(key, header.strip())
+
+
+def _number(field, value):
+    if isinstance(value, bool):
+        raise RowError(f"{field} must be a number")
+    if isinstance(value, (int, float)):
+        number = value
+    else:
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise RowError(f"{field} must be a number, got {value!r}")
+    if number != number or number in (float('inf'), float('-inf')):
+        raise RowError(f"{field} must be a finite number")
+    if isinstance(number, float) and number.is_integer():
+        number = int(number)
+    if field in DIMENSION_FIELDS and number <= 0:
+        raise RowError(f"{field} must be positive")
+    return number
+
+
+def normalize_record(raw, kind):
+    """Validate one raw row and return (kind, record); kind is inferred when None."""
+    record = {}
+    for key, value in raw.items():
+        if key is None or value is None or value == '':
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+            if not value:
+                continue
+        record[key] = value
+
+    if kind is None:
+        kind = 'items' if 'itemId' in record else 'containers' if 'containerId' in record else None
+    if kind == 'items' and 'itemId' not in record:
+        raise RowError("Missing required field: itemId")
+    if kind == 'containers' and 'containerId' not in record:
+        raise RowError("Missing required field: containerId")
+    if kind is None:
+        raise RowError("Row has neither itemId nor containerId")
+
+    for field in NUMERIC_FIELDS:
+        if field in record:
+            record[field] = _number(field, record[field])
+    if isinstance(record.get('perishable'), str):
+        record['perishable'] = record['perishable'].lower() in TRUE_VALUES
+    if 'expiryDate' in record and parse_timestamp(record['expiryDate']) is None:
+        raise RowError(f"Invalid expiryDate {record['expiryDate']!r}")
+    return kind, record
+
+
+def _text_lines(binary_stream):
+    """Decode a binary stream line by line, dropping a leading byte order mark."""
+    first = True
+    for line in binary_stream:
+        text = line.decode('utf-8', errors='replace')
+        if first:
+            text = text.lstrip('\ufeff')
+            first = False
+        yield text
+
+
+def iter_csv_rows(binary_stream, kind=None):
+    """Yield (row_number, kind, record, error) for each data row of a CSV upload."""
+    reader = csv.reader(_text_lines(binary_stream))
+    header = next(reader, None)
+    if header is None:
+        return
+    fields = [field_name(column) for column in header]
+    for row in reader:
+        row_number = reader.line_num
+        if not any(cell.strip() for cell in row):
+            continue
+        if len(row) > len(fields):
+            yield row_number, None, None, f"Expected {len(fields)} columns, got {len(row)}"
+            continue
+        try:
+            row_kind, record = normalize_record(dict(zip(fields, row)), kind)
+        except RowError as e:
+            yield row_number, None, None, str(e)
+            continue
+        yield row_number, row_kind, record, None
+
+
+def iter_ndjson_rows(binary_stream, kind=None):
+    """Yield (line_number, kind, record, error) for each line of an NDJSON upload."""
+    for line_number, line in enumerate(_text_lines(binary_stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            raw = json.loads(line)
+            if not isinstance(raw, dict):
+                raise RowError("Each line must be a JSON object")
+            row_kind, record = normalize_record(raw, kind)
+        except (RowError, json.JSONDecodeError) as e:
+            yield line_number, None, None, str(e)
+            continue
+        yield line_number, row_kind, record, None
+
+
+def chunked(rows, size=CHUNK_SIZE):
+    """Group an iterator into lists of at most size elements."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+ARRANGEMENT_HEADER = ['Item ID', 'Container ID', 'Coordinates (W1,D1,H1)', 'Coordinates (W2,D2,H2)']
+CONTAINER_HEADER = ['Zone', 'Container ID', 'Width (cm)', 'Depth (cm)', 'Height (cm)']
+
+
+def _point(coordinates):
+    return '(' + ','.join(str(value) for value in coordinates) + ')'
+
+
+def csv_lines(rows):
+    """Format rows as one CSV string."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def arrangement_rows(items):
+    """CSV arrangement rows (item, container, start, end) for the placed items."""
+    rows = []
+    for item in items:
+        position = item.get('position')
+        if item.get('containerId') is None or not position:
+            continue
+        rows.append([item['itemId'], item['containerId'],
+                     _point(position['startCoordinates']), _point(position['endCoordinates'])])
+    return rows
+
+
+def container_rows(containers):
+    return [[container.get('zone', ''), container['containerId'], container.get('width', ''),
+             container.get('depth', ''), container.get('height', '')] for container in containers]
+
+
+def ndjson_lines(records):
+    return ''.join(json.dumps(record, default=str) + '\n' for record in records)
@@ -0,0 +1,88 @@
+#changefeed.py
+"""Change feed for clients that mirror the inventory.
+
+Every journaled change gets the next sequence number and is appended to a
+list kept in sequence order, next to a map from each changed record to the
+sequence number of its latest change. An entry whose record changed again
+later is stale and skipped. The changes since a sequence number are found by
+binary search and a page stops after ``limit`` records, so paging through
+the feed costs the size of the pages, not the size of the feed. Stale
+entries are dropped in one pass once they outnumber the live ones. The
+record contents are not stored; callers read the current record, which is
+at least as new as the change.
+
+The feed remembers at most ``capacity`` records. Forgetting the oldest ones
+raises the floor below which the feed can no longer answer, and a client
+that is that far behind has to start over from a full export.
+"""
+import threading
+from bisect import bisect_right
+
+# Stale entries tolerated on top of one per live record before compacting
+COMPACT_SLACK = 1024
+
+
+class ChangeFeed:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        # Parallel lists, in sequence order from position head on
+        self.seqs = []
+        self.entries = []
+        self.head = 0
+        self.latest = {}
+        self.seq = 0
+        self.floor = 0
+
+    def record(self, collection, key, removed=False):
+        """Note that a record of collection was created, changed or (removed) deleted."""
+        with self.lock:
+            self.seq += 1
+            self.latest[(collection, key)] = self.seq
+            self.seqs.append(self.seq)
+            self.entries.append((collection, key, removed))
+            while len(self.latest) > self.capacity:
+                self._forget_oldest()
+            if len(self.seqs) - self.head > 2 * len(self.latest) + COMPACT_SLACK:
+                self._compact()
+
+    def _forget_oldest(self):
+        seq = self.seqs[self.head]
+        collection, key, _ = self.entries[self.head]
+        self.head += 1
+        if self.latest.get((collection, key)) == seq:
+            del self.latest[(collection, key)]
+            self.floor = seq
+        # Forgotten entries are dropped in bulk once they are most of the list
+        if self.head > 64 and self.head * 2 > len(self.seqs):
+            del self.seqs[:self.head]
+            del self.entries[:self.head]
+            self.head = 0
+
+    def _compact(self):
+        live = [(seq, entry) for seq, entry in zip(self.seqs[self.head:], self.entries[self.head:])
+                if self.latest.get(entry[:2]) == seq]
+        self.seqs = [seq for seq, _ in live]
+        self.entries = [entry for _, entry in live]
+        self.head = 0
+
+    def since(self, seq, limit=None):
+        """Changes after seq, oldest first, as (seq, collection, key, removed).
+
+        Returns (changes, next_seq, has_more), where next_seq is the seq to
+        ask from next time, or None when seq is older than the floor or newer
+        than the feed.
+        """
+        with self.lock:
+            if seq < self.floor or seq > self.seq:
+                return None
+            changes = []
+            for position in range(bisect_right(self.seqs, seq, self.head), len(self.seqs)):
+                change_seq = self.seqs[position]
+                collection, key, removed = self.entries[position]
+                if self.latest.get((collection, key)) != change_seq:
+                    continue
+                if limit is not None and len(changes) == limit:
+                    return changes, changes[-1][0], True
+                changes.append((change_seq, collection, key, removed))
+            return changes, self.seq, False
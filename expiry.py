@@ -0,0 +1,79 @@
+#expiry.py
+"""Pending expiries of perishable items.
+
+Expiry dates are parsed once, when an item is registered, and kept in a
+min-heap keyed by the parsed datetime. Advancing the clock pops only the
+items whose expiry has been crossed; each item is reported a single time.
+Rescheduled or cancelled items leave a stale heap entry behind that is
+skipped when it surfaces (lazy deletion).
+"""
+import heapq
+from datetime import datetime
+
+
+def parse_timestamp(value):
+    """Parse an ISO date/time into a naive local datetime, or None if invalid."""
+    try:
+        expiry = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if expiry.tzinfo is not None:
+        expiry = expiry.astimezone().replace(tzinfo=None)
+    return expiry
+
+
+class ExpiryQueue:
+    def __init__(self):
+        self.heap = []
+        self.pending = {}
+        self.counter = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def schedule(self, item_id, expiry):
+        """Track item_id as expiring at expiry, replacing any earlier schedule."""
+        self.counter += 1
+        self.pending[item_id] = (expiry, self.counter)
+        heapq.heappush(self.heap, (expiry, self.counter, item_id))
+        self._compact()
+
+    def cancel(self, item_id):
+        if self.pending.pop(item_id, None) is not None:
+            self._compact()
+
+    def _compact(self):
+        # Rebuild once stale entries outnumber live ones so the heap stays small
+        if len(self.heap) > 2 * len(self.pending) + 64:
+            self.heap = [(expiry, counter, item_id)
+                         for item_id, (expiry, counter) in self.pending.items()]
+            heapq.heapify(self.heap)
+
+    def next_expiry(self):
+        """Earliest pending expiry, or None when nothing is pending."""
+        self._drop_stale()
+        return self.heap[0][0] if self.heap else None
+
+    def expiry_of(self, item_id):
+        entry = self.pending.get(item_id)
+        return entry[0] if entry else None
+
+    def pop_expired(self, now):
+        """Remove and return (item_id, expiry) for expiries strictly before now, earliest first."""
+        expired = []
+        while True:
+            self._drop_stale()
+            if not self.heap or not self.heap[0][0] < now:
+                return expired
+            expiry, counter, item_id = heapq.heappop(self.heap)
+            del self.pending[item_id]
+            expired.append((item_id, expiry))
+
+    def _drop_stale(self):
+        heap = self.heap
+        while heap:
+            expiry, counter, item_id = heap[0]
+            entry = self.pending.get(item_id)
+            if entry is not None and entry[1] == counter:
+                return
+            heapq.heappop(heap)
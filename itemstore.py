@@ -0,0 +1,257 @@
+#itemstore.py
+"""Columnar storage for large item inventories.
+
+``ColumnarItemStore`` is a drop-in replacement for the ``items`` dict. The
+well-known item fields live in two NumPy arrays with one row per item:
+dimensions, mass, priority, usage counters and position coordinates as
+float64 (NaN for a missing value), and zones, container ids, statuses and the
+perishable flag as int32 codes, strings being interned in a shared table.
+Names, descriptions and expiry dates stay Python strings. Anything that does
+not fit a column (unknown fields, odd types) is kept in a small per-row dict,
+so every record comes back exactly as it was stored, apart from whole floats
+which come back as ints.
+
+Reading an item builds a fresh dict from its row, which also matches the
+copy-on-write rule of the app: a reader's record never changes under it.
+Rows freed by removed items are reused. A lock makes each read and write of
+a row atomic with respect to the others.
+"""
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed when the columnar store is used
+    np = None
+
+NUMERIC_FIELDS = ('width', 'depth', 'height', 'mass', 'priority', 'usageLimit', 'remainingUses')
+CODED_FIELDS = ('preferredZone', 'containerId', 'status')
+TEXT_FIELDS = ('name', 'description', 'expiryDate')
+COORDINATE_FIELDS = ('startCoordinates', 'endCoordinates')
+INITIAL_CAPACITY = 1024
+
+# Layout of a row: the numbers block holds NUMERIC_FIELDS followed by the six
+# position coordinates; the codes block holds CODED_FIELDS, then perishable
+# and a position flag
+NUMBER_COLUMNS = len(NUMERIC_FIELDS) + 6
+PERISHABLE_COLUMN = len(CODED_FIELDS)
+POSITION_COLUMN = len(CODED_FIELDS) + 1
+CODE_COLUMNS = len(CODED_FIELDS) + 2
+ABSENT = -2  # the record has no such key
+NONE = -1    # the key is present with value None
+NUMERIC_INDEX = {field: column for column, field in enumerate(NUMERIC_FIELDS)}
+CODED_INDEX = {field: column for column, field in enumerate(CODED_FIELDS)}
+
+
+NUMBER_TYPES = (int, float)
+
+
+def _is_number(value):
+    # bool is excluded, it is a subclass of int but not a number here
+    return type(value) in NUMBER_TYPES
+
+
+def _number(value):
+    return int(value) if value.is_integer() else value
+
+
+def _is_point(point):
+    return (type(point) is list and len(point) == 3 and
+            _is_number(point[0]) and _is_number(point[1]) and _is_number(point[2]))
+
+
+def _is_position(value):
+    return (type(value) is dict and len(value) == 2 and
+            _is_point(value.get('startCoordinates')) and _is_point(value.get('endCoordinates')))
+
+
+class ColumnarItemStore:
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        if np is None:
+            raise RuntimeError("The columnar item store requires numpy")
+        self.lock = threading.RLock()
+        self.rows = {}
+        self.free_rows = []
+        self.size = 0
+        self.capacity = capacity
+        self.numbers = np.full((capacity, NUMBER_COLUMNS), np.nan)
+        self.codes = np.full((capacity, CODE_COLUMNS), ABSENT, dtype=np.int32)
+        self.texts = {field: [None] * capacity for field in TEXT_FIELDS}
+        self.ids = [None] * capacity
+        self.extras = [None] * capacity
+        self.strings = []
+        self.string_codes = {}
+
+    # Mapping interface
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, item_id):
+        return item_id in self.rows
+
+    def __iter__(self):
+        # Iterate over a snapshot of the ids so concurrent writes cannot break it
+        with self.lock:
+            return iter(list(self.rows))
+
+    def __getitem__(self, item_id):
+        with self.lock:
+            return self._read(self.rows[item_id])
+
+    def get(self, item_id, default=None):
+        with self.lock:
+            row = self.rows.get(item_id)
+            return default if row is None else self._read(row)
+
+    def __setitem__(self, item_id, item):
+        with self.lock:
+            row = self.rows.get(item_id)
+            if row is None:
+                row = self._allocate()
+                self.rows[item_id] = row
+            self._write(row, item_id, item)
+
+    def __delitem__(self, item_id):
+        with self.lock:
+            row = self.rows.pop(item_id)
+            self.ids[row] = self.extras[row] = None
+            for column in self.texts.values():
+                column[row] = None
+            self.free_rows.append(row)
+
+    def pop(self, item_id, *default):
+        with self.lock:
+            if item_id not in self.rows and default:
+                return default[0]
+            item = self[item_id]
+            del self[item_id]
+            return item
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        for item_id in self:
+            item = self.get(item_id)
+            if item is not None:
+                yield item
+
+    def items(self):
+        for item_id in self:
+            item = self.get(item_id)
+            if item is not None:
+                yield item_id, item
+
+    # Vectorized access
+
+    def ids_where_missing(self, field):
+        """Ids of the items whose coded field is missing or None, in insertion order."""
+        with self.lock:
+            missing = self.codes[:, CODED_INDEX[field]] < 0
+            # A value of another type lives in the row's extras instead
+            extras = self.extras
+            return [item_id for item_id, row in self.rows.items()
+                    if missing[row] and not (extras[row] and field in extras[row])]
+
+    def nbytes(self):
+        """Bytes held by the NumPy columns."""
+        return self.numbers.nbytes + self.codes.nbytes
+
+    # Rows
+
+    def _allocate(self):
+        if self.free_rows:
+            return self.free_rows.pop()
+        if self.size == self.capacity:
+            self._grow()
+        row = self.size
+        self.size += 1
+        return row
+
+    def _grow(self):
+        extra = self.capacity
+        self.capacity += extra
+        self.numbers = np.concatenate([self.numbers, np.full((extra, NUMBER_COLUMNS), np.nan)])
+        self.codes = np.concatenate([self.codes, np.full((extra, CODE_COLUMNS), ABSENT, dtype=np.int32)])
+        for column in (*self.texts.values(), self.ids, self.extras):
+            column.extend([None] * extra)
+
+    def _code(self, text):
+        if text is None:
+            return NONE
+        code = self.string_codes.get(text)
+        if code is None:
+            code = len(self.strings)
+            self.strings.append(text)
+            self.string_codes[text] = code
+        return code
+
+    def _write(self, row, item_id, item):
+        numbers = [float('nan')] * NUMBER_COLUMNS
+        codes = [ABSENT] * CODE_COLUMNS
+        texts = dict.fromkeys(TEXT_FIELDS)
+        extras = {}
+        for field, value in item.items():
+            if field == 'itemId' and value == item_id:
+                continue
+            if field in NUMERIC_INDEX and _is_number(value):
+                numbers[NUMERIC_INDEX[field]] = value
+            elif field in CODED_INDEX and (value is None or isinstance(value, str)):
+                codes[CODED_INDEX[field]] = self._code(value)
+            elif field in TEXT_FIELDS and isinstance(value, str):
+                texts[field] = value
+            elif field == 'perishable' and isinstance(value, bool):
+                codes[PERISHABLE_COLUMN] = int(value)
+            elif field == 'position' and (value is None or _is_position(value)):
+                codes[POSITION_COLUMN] = NONE if value is None else 1
+                if value is not None:
+                    numbers[len(NUMERIC_FIELDS):] = value['startCoordinates'] + value['endCoordinates']
+            else:
+                extras[field] = value
+        self.numbers[row] = numbers
+        self.codes[row] = codes
+        self.ids[row] = item_id
+        for field, text in texts.items():
+            self.texts[field][row] = text
+        self.extras[row] = extras or None
+
+    def _read(self, row):
+        item = {'itemId': self.ids[row]}
+        for field, column in self.texts.items():
+            if column[row] is not None:
+                item[field] = column[row]
+        numbers = self.numbers[row].tolist()
+        for column, field in enumerate(NUMERIC_FIELDS):
+            value = numbers[column]
+            if value == value:
+                item[field] = int(value) if value.is_integer() else value
+        codes = self.codes[row].tolist()
+        for column, field in enumerate(CODED_FIELDS):
+            code = codes[column]
+            if code != ABSENT:
+                item[field] = None if code == NONE else self.strings[code]
+        if codes[PERISHABLE_COLUMN] != ABSENT:
+            item['perishable'] = bool(codes[PERISHABLE_COLUMN])
+        if codes[POSITION_COLUMN] == NONE:
+            item['position'] = None
+        elif codes[POSITION_COLUMN] != ABSENT:
+            coordinates = [_number(value) for value in numbers[len(NUMERIC_FIELDS):]]
+            item['position'] = {"startCoordinates": coordinates[:3], "endCoordinates": coordinates[3:]}
+        if self.extras[row]:
+            item.update(self.extras[row])
+        return item
+
+
+def iter_records(items):
+    """Iterate over the records of a dict or columnar store while other threads write to it."""
+    if isinstance(items, ColumnarItemStore):
+        return items.values()
+    # Listing a dict's values happens in one step, without releasing the GIL
+    return iter(list(items.values()))
+
+
+def unplaced_item_ids(items):
+    """Ids of the items that are not in a container, for a dict or a columnar store."""
+    if isinstance(items, ColumnarItemStore):
+        return items.ids_where_missing('containerId')
+    return [item_id for item_id, item in items.items() if item.get('containerId') is None]
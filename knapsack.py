@@ -0,0 +1,66 @@
+#knapsack.py
+"""Choosing waste items for the undocking module under its mass limit.
+
+This is a 0/1 knapsack: each waste item has a mass and a value (the volume
+it clears, by default) and the chosen items must not weigh more than the
+limit. Masses are rounded up to a grid of at most MAX_BUCKETS steps of the
+limit, so the dynamic programme over (items, mass) stays at most MAX_CELLS
+cells and runs as one NumPy operation per item, whatever the masses look
+like. Rounding up keeps every choice within the true limit; the mass the
+rounding left unused is then filled greedily with the best value per kg.
+"""
+import numpy as np
+
+MAX_BUCKETS = 10000
+MAX_CELLS = 10000000
+MIN_BUCKETS = 100
+
+
+def select_items(candidates, max_mass):
+    """Pick candidates maximising total value with total mass at most max_mass.
+
+    candidates lists ``(key, mass, value)``; masses and values must not be
+    negative. Returns the chosen keys, in candidate order.
+    """
+    chosen = set()
+    weighted = []
+    for index, (key, mass, value) in enumerate(candidates):
+        if value <= 0 or mass > max_mass:
+            continue
+        if mass <= 0:
+            chosen.add(index)
+        else:
+            weighted.append(index)
+
+    if weighted and max_mass > 0:
+        buckets = max(MIN_BUCKETS, min(MAX_BUCKETS, MAX_CELLS // len(weighted)))
+        step = max_mass / buckets
+        # Round masses up, so no choice can exceed the limit
+        sizes = [int(np.ceil(candidates[index][1] / step - 1e-9)) for index in weighted]
+
+        best = np.zeros(buckets + 1)
+        taken = np.zeros((len(weighted), buckets + 1), dtype=bool)
+        for row, (index, size) in enumerate(zip(weighted, sizes)):
+            if size > buckets:
+                continue
+            with_item = best[:buckets + 1 - size] + candidates[index][2]
+            better = with_item > best[size:]
+            taken[row, size:] = better
+            best[size:] = np.where(better, with_item, best[size:])
+
+        capacity = int(np.argmax(best))
+        for row in range(len(weighted) - 1, -1, -1):
+            if taken[row, capacity]:
+                chosen.add(weighted[row])
+                capacity -= sizes[row]
+
+        # Use up the mass the rounding left over
+        remaining = max_mass - sum(candidates[index][1] for index in chosen)
+        leftovers = sorted((index for index in weighted if index not in chosen),
+                           key=lambda index: candidates[index][2] / candidates[index][1], reverse=True)
+        for index in leftovers:
+            if candidates[index][1] <= remaining:
+                chosen.add(index)
+                remaining -= candidates[index][1]
+
+    return [candidates[index][0] for index in sorted(chosen)]
@@ -0,0 +1,152 @@
+#logstore.py
+"""Bounded store for the system logs.
+
+Entries live in a fixed-size ring: entry number ``seq`` sits in slot
+``seq % capacity`` and the oldest entry is overwritten once the ring is full,
+so memory is capped. Every entry also gets its sequence number appended to
+per-action, per-item and per-user lists. Those lists are sorted by
+construction, the oldest entry is always at their front when it is evicted,
+and a time range maps to a sequence range by binary search because entries
+are appended in timestamp order. A query therefore walks only the entries of
+its most selective filter instead of the whole log. Every request thread
+logs, so appends and queries are serialised by a lock.
+"""
+import threading
+from datetime import datetime
+from bisect import bisect_left, bisect_right
+
+
+class _SeqList:
+    """Ascending sequence numbers with cheap removal from the front."""
+
+    def __init__(self):
+        self.seqs = []
+        self.head = 0
+
+    def __len__(self):
+        return len(self.seqs) - self.head
+
+    def append(self, seq):
+        self.seqs.append(seq)
+
+    def popleft(self):
+        self.head += 1
+        if self.head > 64 and self.head * 2 > len(self.seqs):
+            del self.seqs[:self.head]
+            self.head = 0
+
+    def between(self, low, high):
+        """Sequence numbers within [low, high], oldest first."""
+        start = bisect_left(self.seqs, low, self.head)
+        stop = bisect_right(self.seqs, high, start)
+        return self.seqs[start:stop]
+
+
+class LogStore:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = [None] * capacity
+        self.times = [None] * capacity
+        self.next_seq = 0
+        self.indexes = {'action': {}, 'itemId': {}, 'userId': {}}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.next_seq, self.capacity)
+
+    @property
+    def first_seq(self):
+        return max(0, self.next_seq - self.capacity)
+
+    def append(self, details):
+        """Store a log entry made of details, timestamped now.
+
+        The time is taken under the lock, so entries are stored in timestamp
+        order whichever thread logs them. Returns the stored entry and its
+        time as a datetime.
+        """
+        with self.lock:
+            moment = datetime.now()
+            entry = {"timestamp": moment.isoformat(), **details}
+            self._append(entry, moment)
+        return entry, moment
+
+    def _append(self, entry, moment):
+        seq = self.next_seq
+        slot = seq % self.capacity
+        if seq >= self.capacity:
+            self._evict(self.entries[slot])
+        self.entries[slot] = entry
+        self.times[slot] = moment
+        self.next_seq += 1
+        for field, index in self.indexes.items():
+            value = entry.get(field)
+            if value is not None:
+                index.setdefault(value, _SeqList()).append(seq)
+        return seq
+
+    def _evict(self, entry):
+        for field, index in self.indexes.items():
+            value = entry.get(field)
+            if value is not None:
+                seqs = index[value]
+                seqs.popleft()
+                if not seqs:
+                    del index[value]
+
+    def _time_at(self, seq):
+        return self.times[seq % self.capacity]
+
+    def _seq_range(self, start, end):
+        """Sequence numbers [low, high] of the entries logged between start and end."""
+        low, high = self.first_seq, self.next_seq - 1
+        if start is not None:
+            lo, hi = low, self.next_seq
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._time_at(mid) < start:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            low = lo
+        if end is not None:
+            lo, hi = low, self.next_seq
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._time_at(mid) <= end:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            high = lo - 1
+        return low, high
+
+    def query(self, action=None, item_id=None, user_id=None, start=None, end=None, limit=None):
+        """Matching entries, oldest first; with limit only the newest limit of them."""
+        with self.lock:
+            return self._query(action, item_id, user_id, start, end, limit)
+
+    def _query(self, action, item_id, user_id, start, end, limit):
+        low, high = self._seq_range(start, end)
+        if low > high:
+            return []
+
+        filters = {'action': action, 'itemId': item_id, 'userId': user_id}
+        filters = {field: value for field, value in filters.items() if value is not None}
+        candidates = None
+        for field, value in filters.items():
+            seqs = self.indexes[field].get(value)
+            if seqs is None:
+                return []
+            if candidates is None or len(seqs) < len(candidates):
+                candidates = seqs
+        seqs = candidates.between(low, high) if candidates is not None else range(low, high + 1)
+
+        matches = []
+        for seq in reversed(seqs):
+            entry = self.entries[seq % self.capacity]
+            if all(entry.get(field) == value for field, value in filters.items()):
+                matches.append(entry)
+                if limit and len(matches) >= limit:
+                    break
+        matches.reverse()
+        return matches
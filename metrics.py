@@ -0,0 +1,133 @@
+#metrics.py
+"""Request and inventory metrics in the Prometheus text format.
+
+Counters and histograms are updated by the request hooks and keep one series
+per label combination; gauges are read from callbacks when ``/metrics`` is
+scraped, so they cost nothing between scrapes. A single lock per metric keeps
+updates from concurrent requests consistent, and rendering copies the
+series under that lock before formatting them.
+"""
+import threading
+
+# Default latency buckets, in seconds
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Request and response sizes, in bytes
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000, 100000000)
+# Items per placement batch
+BATCH_BUCKETS = (1, 10, 100, 1000, 10000, 100000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def render(self):
+        with self.lock:
+            series = sorted(self.series.items())
+        return self.header() + [f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+                                for labels, value in series]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        with self.lock:
+            counts = self.series.get(labels)
+            if counts is None:
+                # One count per bucket, then the sum and the total count
+                counts = self.series[labels] = [0] * len(self.buckets) + [0, 0]
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[position] += 1
+                    break
+            counts[-2] += value
+            counts[-1] += 1
+
+    def render(self):
+        with self.lock:
+            series = sorted((labels, list(counts)) for labels, counts in self.series.items())
+        lines = self.header()
+        for labels, counts in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, [('le', _number(bound))])} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, [('le', '+Inf')])} {counts[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(counts[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {counts[-1]}")
+        return lines
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, read):
+        super().__init__(name, help_text)
+        self.read = read
+
+    def render(self):
+        return self.header() + [f"{self.name} {_number(self.read())}"]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DURATION_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name, help_text, read):
+        return self.register(Gauge(name, help_text, read))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
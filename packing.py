@@ -0,0 +1,417 @@
+#packing.py
+"""3D packing engine used by the placement API.
+
+Free space inside each container is tracked as a list of maximal empty
+spaces (EMS): axis-aligned boxes that are empty and not contained in any
+other empty box. Placing an item splits only the spaces it intersects, so
+finding a spot for the next item means looking at the remaining spaces
+instead of probing every coordinate.
+
+Boxes and spaces are plain tuples ``(x1, y1, z1, x2, y2, z2)`` where x runs
+along the container width, y along its depth (0 is the open face) and z
+along its height.
+
+When a placement cuts many spaces of a fragmented container, checking the
+new slabs against each other and against the untouched spaces is done as
+one NumPy array operation over all pairs. Small checks stay in Python,
+which stops at the first hit and skips NumPy's per-call overhead; so does
+find(), whose scan usually stops at one of the first spaces and is already
+gated by the max_dims/max_volume rejects.
+"""
+import multiprocessing
+import os
+import threading
+from bisect import bisect_left, insort
+from copy import copy
+from itertools import permutations
+
+import numpy as np
+
+from spatial import BlockingGraph, BoxIndex, cell_size_for
+
+UNBOUNDED = float('inf')
+
+# Vectorize the maximality check from this many (new slab, space) pairs
+VECTORIZE_PAIRS = 1024
+
+
+def item_dimensions(item):
+    """Return (width, depth, height) of an item, defaulting to 1 like the API does."""
+    return (item.get('width', 1), item.get('depth', 1), item.get('height', 1))
+
+
+def container_dimensions(container):
+    """Return (width, depth, height) of a container; missing sides are unbounded."""
+    return (
+        container.get('width', UNBOUNDED),
+        container.get('depth', UNBOUNDED),
+        container.get('height', UNBOUNDED)
+    )
+
+
+def orientations(dims):
+    """All distinct axis-aligned rotations of dims, original orientation first."""
+    return list(dict.fromkeys(permutations(dims)))
+
+
+def position_to_box(position):
+    start = position['startCoordinates']
+    end = position['endCoordinates']
+    return (start[0], start[1], start[2], end[0], end[1], end[2])
+
+
+def box_to_position(box):
+    return {
+        "startCoordinates": [box[0], box[1], box[2]],
+        "endCoordinates": [box[3], box[4], box[5]]
+    }
+
+
+def _volume(box):
+    return (box[3] - box[0]) * (box[4] - box[1]) * (box[5] - box[2])
+
+
+def _remaining(entry):
+    return entry[0]
+
+
+def _corner(space):
+    return (space[1], space[2], space[0])
+
+
+class ContainerSpace:
+    """Free-space bookkeeping and box index for one container.
+
+    Spaces thinner than ``min_side`` are dropped as soon as they appear:
+    no item can use them and they would only slow down every later split.
+
+    Retrieval plans are read without the server's state lock, and reading
+    may build the box grid and blocking graph, so ``lock`` guards those two
+    against the writer. A pickled space leaves them out; the receiving side
+    builds them again if it needs them.
+    """
+
+    def __init__(self, width, depth, height, min_side=0):
+        self.dims = (width, depth, height)
+        self.min_side = min_side
+        self.lock = threading.Lock()
+        self.index = BoxIndex(cell_size_for(self.dims))
+        self.boxes = self.index.boxes
+        self.blocking = BlockingGraph(self.index)
+        self.used_volume = 0
+        # Free space is worked out on first use, so loading boxes is cheap
+        self.spaces = []
+        self.max_dims = self.dims
+        self.max_volume = width * depth * height
+        self.dirty = True
+
+    def set_min_side(self, min_side):
+        """Lower the discard threshold, recovering spaces dropped under the old one."""
+        if min_side < self.min_side:
+            self.dirty = True
+        self.min_side = min_side
+
+    def resize(self, width, depth, height):
+        """Change the container bounds, keeping the boxes already inside it."""
+        self.dims = (width, depth, height)
+        self.dirty = True
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['lock']
+        state['index'] = BoxIndex(self.index.cell_size)
+        state['index'].boxes = self.boxes
+        state['blocking'] = BlockingGraph(state['index'])
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def copy(self):
+        """An independent copy, for planning changes without making them."""
+        clone = copy(self)
+        with self.lock:
+            clone.index = self.index.copy()
+            clone.blocking = self.blocking.copy(clone.index)
+        clone.boxes = clone.index.boxes
+        clone.spaces = list(self.spaces)
+        return clone
+
+    @property
+    def remaining_volume(self):
+        width, depth, height = self.dims
+        return width * depth * height - self.used_volume
+
+    def add(self, item_id, box):
+        """Record box as occupied by item_id."""
+        self.remove(item_id)
+        with self.lock:
+            self.index.insert(item_id, box)
+            self.blocking.add(item_id, box)
+        self.used_volume += _volume(box)
+        if not self.dirty:
+            self._subtract(box)
+
+    def remove(self, item_id):
+        """Free the box held by item_id; free space is rebuilt on next use."""
+        box = self.boxes.get(item_id)
+        if box is not None:
+            with self.lock:
+                self.index.remove(item_id)
+                self.blocking.remove(item_id)
+            self.used_volume -= _volume(box)
+            self.dirty = True
+
+    def in_bounds(self, box):
+        width, depth, height = self.dims
+        return (box[0] >= 0 and box[1] >= 0 and box[2] >= 0 and
+                box[3] <= width and box[4] <= depth and box[5] <= height)
+
+    def collisions(self, box, exclude=None):
+        """Ids of the items whose boxes overlap box, ignoring item exclude."""
+        with self.lock:
+            return self.index.overlapping(box, exclude)
+
+    def removal_order(self, item_id):
+        """Ids of the items to move out of the way before item_id can be retrieved."""
+        with self.lock:
+            return self.blocking.removal_order(item_id)
+
+    def find(self, dims):
+        """Best box for an item of the given dims, trying every rotation.
+
+        Spaces nearest the open face (then lowest, then leftmost) win, and
+        within a space the rotation leaving the least slack is used.
+        Returns None when the item does not fit anywhere.
+        """
+        if self.dirty:
+            self._rebuild()
+        if dims[0] * dims[1] * dims[2] > self.max_volume:
+            return None
+        max_w, max_d, max_h = self.max_dims
+        candidates = [o for o in orientations(dims)
+                      if o[0] <= max_w and o[1] <= max_d and o[2] <= max_h]
+        if not candidates:
+            return None
+
+        # Spaces are kept ordered by corner, so the first one that fits wins
+        for x1, y1, z1, x2, y2, z2 in self.spaces:
+            free_w, free_d, free_h = x2 - x1, y2 - y1, z2 - z1
+            best = None
+            best_slack = None
+            for w, d, h in candidates:
+                if w > free_w or d > free_d or h > free_h:
+                    continue
+                slack = (free_w - w) + (free_d - d) + (free_h - h)
+                if best_slack is None or slack < best_slack:
+                    best_slack = slack
+                    best = (x1, y1, z1, x1 + w, y1 + d, z1 + h)
+            if best is not None:
+                return best
+        return None
+
+    def _rebuild(self):
+        width, depth, height = self.dims
+        self.spaces = [(0, 0, 0, width, depth, height)]
+        self.dirty = False
+        for box in self.boxes.values():
+            self._subtract(box)
+        self._update_max_dims()
+
+    def _subtract(self, box):
+        bx1, by1, bz1, bx2, by2, bz2 = box
+        min_side = self.min_side
+        kept = []
+        new = []
+        for space in self.spaces:
+            x1, y1, z1, x2, y2, z2 = space
+            if bx1 >= x2 or bx2 <= x1 or by1 >= y2 or by2 <= y1 or bz1 >= z2 or bz2 <= z1:
+                kept.append(space)
+                continue
+            # Split the intersected space into the up to six slabs around the box
+            if bx1 - x1 >= min_side and bx1 > x1:
+                new.append((x1, y1, z1, bx1, y2, z2))
+            if x2 - bx2 >= min_side and bx2 < x2:
+                new.append((bx2, y1, z1, x2, y2, z2))
+            if by1 - y1 >= min_side and by1 > y1:
+                new.append((x1, y1, z1, x2, by1, z2))
+            if y2 - by2 >= min_side and by2 < y2:
+                new.append((x1, by2, z1, x2, y2, z2))
+            if bz1 - z1 >= min_side and bz1 > z1:
+                new.append((x1, y1, z1, x2, y2, bz1))
+            if z2 - bz2 >= min_side and bz2 < z2:
+                new.append((x1, y1, bz2, x2, y2, z2))
+
+        if len(kept) == len(self.spaces):
+            return
+
+        # Keep only maximal spaces: a new slab may sit inside an untouched
+        # space or inside another slab. Untouched spaces stay maximal.
+        # Checking the biggest slabs first means each slab only has to be
+        # compared with the slabs already accepted.
+        new = sorted(set(new), key=_volume, reverse=True)
+        if len(new) * len(self.spaces) >= VECTORIZE_PAIRS:
+            maximal = _maximal_slabs(kept, new)
+        else:
+            maximal = []
+            for space in new:
+                nx1, ny1, nz1, nx2, ny2, nz2 = space
+                for other in kept:
+                    if (other[0] <= nx1 and other[1] <= ny1 and other[2] <= nz1 and
+                            other[3] >= nx2 and other[4] >= ny2 and other[5] >= nz2):
+                        break
+                else:
+                    for other in maximal:
+                        if (other[0] <= nx1 and other[1] <= ny1 and other[2] <= nz1 and
+                                other[3] >= nx2 and other[4] >= ny2 and other[5] >= nz2):
+                            break
+                    else:
+                        maximal.append(space)
+
+        self.spaces = kept + maximal
+        self.spaces.sort(key=_corner)
+        self._update_max_dims()
+
+    def _update_max_dims(self):
+        max_w = max_d = max_h = max_volume = 0
+        for x1, y1, z1, x2, y2, z2 in self.spaces:
+            if x2 - x1 > max_w:
+                max_w = x2 - x1
+            if y2 - y1 > max_d:
+                max_d = y2 - y1
+            if z2 - z1 > max_h:
+                max_h = z2 - z1
+            volume = (x2 - x1) * (y2 - y1) * (z2 - z1)
+            if volume > max_volume:
+                max_volume = volume
+        self.max_dims = (max_w, max_d, max_h)
+        self.max_volume = max_volume
+
+
+def _maximal_slabs(kept, slabs):
+    """The slabs (sorted biggest first) not inside a kept space or an earlier slab.
+
+    A slab inside an earlier slab is also inside whatever swallowed that
+    slab, so comparing against every earlier slab gives the same result as
+    comparing against the accepted ones only.
+    """
+    boxes = np.array(slabs, dtype=float).T
+    inside = _contains(boxes, boxes)
+    inside[np.triu_indices(len(slabs))] = False
+    dropped = inside.any(axis=1)
+    if kept:
+        dropped |= _contains(np.array(kept, dtype=float).T, boxes).any(axis=1)
+    return [slab for slab, drop in zip(slabs, dropped.tolist()) if not drop]
+
+
+def _contains(outer, inner):
+    """[i, j] is True when box inner[:, i] lies within box outer[:, j].
+
+    Boxes are given column-wise, one row per coordinate.
+    """
+    result = outer[0] <= inner[0][:, None]
+    for axis in (1, 2):
+        result &= outer[axis] <= inner[axis][:, None]
+    for axis in (3, 4, 5):
+        result &= outer[axis] >= inner[axis][:, None]
+    return result
+
+
+class ZoneIndex:
+    """Containers grouped by zone, ordered by remaining free volume.
+
+    Each zone keeps a sorted list of ``(remaining_volume, container_id)`` so
+    placement only visits containers of the item's zone, starting with the
+    fullest one that still has enough volume left (best fit).
+    """
+
+    def __init__(self):
+        self.zones = {}
+        self.entries = {}
+
+    def update(self, container_id, zone, remaining):
+        """Insert or move a container after its zone or free volume changed."""
+        entry = self.entries.get(container_id)
+        if entry == (zone, remaining):
+            return
+        if entry is not None:
+            self.discard(container_id)
+        insort(self.zones.setdefault(zone, []), (remaining, container_id))
+        self.entries[container_id] = (zone, remaining)
+
+    def discard(self, container_id):
+        entry = self.entries.pop(container_id, None)
+        if entry is None:
+            return
+        zone, remaining = entry
+        ranked = self.zones[zone]
+        del ranked[bisect_left(ranked, (remaining, container_id))]
+        if not ranked:
+            del self.zones[zone]
+
+    def containers_in(self, zone):
+        """Container ids of a zone, fullest first."""
+        return [container_id for _, container_id in self.zones.get(zone, [])]
+
+    def candidates(self, zone, volume):
+        """Yield container ids of zone with at least volume free, fullest first.
+
+        The ranking may change while a caller places into a yielded container,
+        so callers stop iterating once they have used one.
+        """
+        ranked = self.zones.get(zone)
+        if not ranked:
+            return
+        for position in range(bisect_left(ranked, volume, key=_remaining), len(ranked)):
+            yield ranked[position][1]
+
+
+def packing_order(item):
+    """Sort key for a placement batch: high priority first, then larger items."""
+    width, depth, height = item_dimensions(item)
+    return (-(item.get('priority') or 0), -(width * depth * height))
+
+
+def pack_zone(spaces, pending):
+    """Place pending items into the containers of one zone.
+
+    spaces maps container id to ContainerSpace for every container of the
+    zone and pending lists ``(item_id, dims)`` in packing order. Each item
+    goes into the fullest container with room for it, exactly as a single
+    pass over all zones would do, since zones never share containers. The
+    spaces are updated in place and also returned, so the function can run
+    in a worker process. Returns ``(placements, spaces)`` with placements
+    as ``(item_id, container_id, box)`` in packing order.
+    """
+    ranking = ZoneIndex()
+    for container_id, space in spaces.items():
+        ranking.update(container_id, None, space.remaining_volume)
+
+    placements = []
+    for item_id, dims in pending:
+        for container_id in ranking.candidates(None, dims[0] * dims[1] * dims[2]):
+            space = spaces[container_id]
+            box = space.find(dims)
+            if box is None:
+                continue
+            space.add(item_id, box)
+            ranking.update(container_id, None, space.remaining_volume)
+            placements.append((item_id, container_id, box))
+            break
+    return placements, spaces
+
+
+def init_pack_worker():
+    """Pool initializer: the worker exits as soon as the process that started it does.
+
+    Pool workers otherwise wait for work forever once their parent is gone.
+    """
+    parent = multiprocessing.parent_process()
+    if parent is None:
+        return
+
+    def exit_with_parent():
+        parent.join()
+        os._exit(0)
+    threading.Thread(target=exit_with_parent, name='exit-with-parent', daemon=True).start()
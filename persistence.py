@@ -0,0 +1,397 @@
+#persistence.py
+"""Storage backends for the station state.
+
+Every state change is journaled as a small JSON operation:
+
+    {"op": "container", "record": {...}}   container created or replaced
+    {"op": "item", "record": {...}}        item created, moved or updated
+    {"op": "remove", "itemId": "..."}      item removed from the station
+    {"op": "time", "currentTime": "..."}   simulated clock moved
+    {"op": "reset"}                        drop everything (replay only)
+
+``StateStore`` is the default and keeps nothing: state lives in memory only.
+``WriteAheadLog`` makes one process durable. ``SQLiteStore`` keeps the state
+in a SQLite database in WAL mode so several worker processes can share it:
+each worker serves requests from its own in-memory copy, writes go through
+to the database, and at the start of every request a worker that is behind
+replays the changes other workers committed since it last caught up.
+
+WriteAheadLog operations are buffered per request thread and appended to the
+current WAL segment (``wal-00000001.log``, ...) in one write when that
+request finishes, so a request never flushes another one's operations.
+Because every operation is an upsert or a delete, replaying an operation
+twice is harmless. That makes snapshots cheap: the WAL is rotated to a new
+segment and the state is written to ``snapshot.ndjson`` in the background
+while requests keep going; recovery loads the snapshot and replays every
+segment from the one the snapshot started, so changes that raced with the
+snapshot writer are simply applied again.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+
+SEGMENT_PATTERN = re.compile(r'^wal-(\d{8})\.log$')
+SNAPSHOT_NAME = 'snapshot.ndjson'
+
+# Changes kept in the SQLite change feed; a worker that falls further behind
+# than this reloads the whole state instead
+CHANGE_RETENTION = 100000
+
+
+class StateStore:
+    """In-memory only storage, and the interface every backend implements."""
+
+    def recover(self):
+        """Yield the stored state as operations."""
+        return iter(())
+
+    def begin(self, write):
+        """Start a request."""
+
+    def behind(self):
+        """Whether other processes committed operations this one has not applied."""
+        return False
+
+    def catch_up(self):
+        """Return the operations other processes committed since the last catch-up.
+
+        The caller must apply them while holding the lock its writers hold,
+        so no write can run between taking the operations and applying them.
+        """
+        return []
+
+    def log(self, op):
+        """Record an operation made by the current request."""
+
+    def commit(self, state_ops):
+        """Persist the operations of the current request.
+
+        state_ops() yields the whole current state as operations, for
+        backends that compact their log into snapshots.
+        """
+
+    def rollback(self):
+        """Abandon the current request's operations if they were not committed."""
+
+
+class WriteAheadLog(StateStore):
+    def __init__(self, data_dir, snapshot_every=100000, fsync=False):
+        self.data_dir = data_dir
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        # Operations of the request running on each thread
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.file = None
+        self.ops_since_snapshot = 0
+        self.snapshot_thread = None
+        os.makedirs(data_dir, exist_ok=True)
+        segments = self._segments()
+        # Never append to a segment older than the one the snapshot replays from
+        self.segment = max(segments[-1] if segments else 1, self._snapshot_segment())
+
+    def _snapshot_segment(self):
+        path = os.path.join(self.data_dir, SNAPSHOT_NAME)
+        if not os.path.exists(path):
+            return 1
+        with open(path, encoding='utf-8') as snapshot:
+            return json.loads(snapshot.readline())['segment']
+
+    def _segments(self):
+        numbers = []
+        for name in os.listdir(self.data_dir):
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def _segment_path(self, number):
+        return os.path.join(self.data_dir, f"wal-{number:08d}.log")
+
+    def recover(self):
+        """Yield the operations of the last snapshot and of every later WAL segment.
+
+        A torn last line (a crash in the middle of a write) ends replay of
+        that segment.
+        """
+        first_segment = 1
+        snapshot_path = os.path.join(self.data_dir, SNAPSHOT_NAME)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, encoding='utf-8') as snapshot:
+                for line in snapshot:
+                    op = json.loads(line)
+                    if op['op'] == 'meta':
+                        first_segment = op['segment']
+                    else:
+                        yield op
+
+        for number in self._segments():
+            if number < first_segment:
+                continue
+            with open(self._segment_path(number), encoding='utf-8') as segment:
+                for line in segment:
+                    try:
+                        op = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    self.ops_since_snapshot += 1
+                    yield op
+
+    def log(self, op):
+        """Buffer an operation of the current request until it commits."""
+        pending = getattr(self.local, 'pending', None)
+        if pending is None:
+            pending = self.local.pending = []
+        pending.append(op)
+
+    def commit(self, state_ops=None):
+        """Append the current request's operations to the WAL in one write."""
+        ops = getattr(self.local, 'pending', None)
+        self.local.pending = []
+        if not ops:
+            return
+        with self.lock:
+            if self.file is None:
+                self.file = open(self._segment_path(self.segment), 'a', encoding='utf-8')
+            self.file.write(''.join(json.dumps(op, default=str) + '\n' for op in ops))
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+            self.ops_since_snapshot += len(ops)
+        if state_ops is not None and self.snapshot_due():
+            self.start_snapshot(state_ops)
+
+    def rollback(self):
+        self.local.pending = []
+
+    def snapshot_due(self):
+        return (self.ops_since_snapshot >= self.snapshot_every and
+                not (self.snapshot_thread and self.snapshot_thread.is_alive()))
+
+    def start_snapshot(self, iter_ops):
+        """Rotate the WAL and write a snapshot from iter_ops() in a background thread.
+
+        iter_ops must yield the current state as operations; it may observe
+        changes made after the rotation, which replay makes harmless.
+        """
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            self.segment += 1
+            first_segment = self.segment
+            self.ops_since_snapshot = 0
+        self.snapshot_thread = threading.Thread(
+            target=self._write_snapshot, args=(first_segment, iter_ops),
+            name='snapshot', daemon=True
+        )
+        self.snapshot_thread.start()
+        return self.snapshot_thread
+
+    def _write_snapshot(self, first_segment, iter_ops):
+        path = os.path.join(self.data_dir, SNAPSHOT_NAME)
+        temporary = path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as snapshot:
+            snapshot.write(json.dumps({"op": "meta", "segment": first_segment}) + '\n')
+            batch = []
+            for op in iter_ops():
+                batch.append(json.dumps(op, default=str))
+                if len(batch) >= 1000:
+                    snapshot.write('\n'.join(batch) + '\n')
+                    batch = []
+            if batch:
+                snapshot.write('\n'.join(batch) + '\n')
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(temporary, path)
+
+        # Segments before the snapshot are no longer needed for recovery
+        for number in self._segments():
+            if number < first_segment:
+                os.remove(self._segment_path(number))
+
+
+class SQLiteStore(StateStore):
+    """State shared by several processes through one SQLite database.
+
+    Records are kept in ``containers``/``items`` tables and every committed
+    operation is also appended to the ``changes`` table, whose sequence
+    numbers tell a process which changes it has not applied yet. Write
+    requests take the database write lock for their whole duration
+    (``BEGIN IMMEDIATE``), so they are serialised across processes and always
+    start from the latest state.
+    """
+
+    def __init__(self, path, busy_timeout=30):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.local = threading.local()
+        self.sync_lock = threading.Lock()
+        self.last_seq = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS containers (container_id TEXT PRIMARY KEY, record TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS items (item_id TEXT PRIMARY KEY, record TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, op TEXT NOT NULL);
+        """)
+        # Names the database's change sequence for change feed clients
+        connection.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('feedId', ?)",
+                           (os.urandom(8).hex(),))
+        self.feed_id = connection.execute("SELECT value FROM meta WHERE key = 'feedId'").fetchone()[0]
+
+    def _connection(self):
+        # sqlite3 connections must stay on the thread that opened them
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                                         isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+            self.local.pending = []
+            self.local.writing = False
+        return connection
+
+    def recover(self):
+        connection = self._connection()
+        # One read transaction, so the records and last_seq agree
+        connection.execute("BEGIN")
+        try:
+            self.last_seq = connection.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+            ops = list(self._state_ops(connection))
+        finally:
+            connection.execute("COMMIT")
+        return iter(ops)
+
+    @staticmethod
+    def _state_ops(connection):
+        row = connection.execute("SELECT value FROM meta WHERE key = 'currentTime'").fetchone()
+        if row:
+            yield {"op": "time", "currentTime": row[0]}
+        for (record,) in connection.execute("SELECT record FROM containers ORDER BY rowid"):
+            yield {"op": "container", "record": json.loads(record)}
+        for (record,) in connection.execute("SELECT record FROM items ORDER BY rowid"):
+            yield {"op": "item", "record": json.loads(record)}
+
+    def begin(self, write):
+        connection = self._connection()
+        self.local.pending = []
+        if write:
+            connection.execute("BEGIN IMMEDIATE")
+            self.local.writing = True
+
+    def behind(self):
+        last_seq = self._connection().execute("SELECT MAX(seq) FROM changes").fetchone()[0]
+        return last_seq is not None and last_seq > self.last_seq
+
+    def catch_up(self):
+        connection = self._connection()
+        with self.sync_lock:
+            first_seq, last_seq = connection.execute("SELECT MIN(seq), MAX(seq) FROM changes").fetchone()
+            if last_seq is None or last_seq <= self.last_seq:
+                return []
+            if first_seq > self.last_seq + 1:
+                # The changes we missed were pruned, start over from the tables
+                ops = [{"op": "reset"}] + list(self._state_ops(connection))
+            else:
+                ops = [json.loads(op) for (op,) in connection.execute(
+                    "SELECT op FROM changes WHERE seq > ? AND seq <= ? ORDER BY seq",
+                    (self.last_seq, last_seq))]
+            self.last_seq = last_seq
+            return ops
+
+    def changes_since(self, seq, limit=None):
+        """Records changed after seq, read from the changes table.
+
+        Same contract as ChangeFeed.since: returns (changes, next_seq,
+        has_more) with changes as (seq, collection, key, removed), or None
+        when seq was pruned or is newer than the changes this process has
+        applied. limit caps the changes read, so a page may name fewer
+        records when one changed several times.
+        """
+        current = self.last_seq
+        connection = self._connection()
+        # One read transaction, so pruning cannot slip between the queries
+        connection.execute("BEGIN")
+        try:
+            first_seq = connection.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+            rows = connection.execute(
+                "SELECT seq, op FROM changes WHERE seq > ? AND seq <= ? ORDER BY seq LIMIT ?",
+                (seq, current, -1 if limit is None else limit)).fetchall()
+        finally:
+            connection.execute("COMMIT")
+        floor = current if first_seq is None else first_seq - 1
+        if seq < floor or seq > current:
+            return None
+
+        latest = {}
+        for change_seq, op in rows:
+            op = json.loads(op)
+            if op['op'] == 'container':
+                change = ("containers", op['record']['containerId'], False)
+            elif op['op'] in ('item', 'remove'):
+                change = ("items", op['itemId'] if op['op'] == 'remove' else op['record']['itemId'],
+                          op['op'] == 'remove')
+            else:
+                continue
+            latest[change[:2]] = (change_seq,) + change
+        changes = sorted(latest.values(), key=lambda change: change[0])
+        if limit is not None and len(rows) == limit and rows[-1][0] < current:
+            return changes, rows[-1][0], True
+        return changes, current, False
+
+    def log(self, op):
+        self._connection()
+        self.local.pending.append(op)
+
+    def commit(self, state_ops=None):
+        connection = self._connection()
+        ops, self.local.pending = self.local.pending, []
+        if not self.local.writing:
+            return
+        try:
+            for op in ops:
+                self._write(connection, op)
+            connection.executemany("INSERT INTO changes (op) VALUES (?)",
+                                   [(json.dumps(op, default=str),) for op in ops])
+            seq = connection.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+            connection.execute("DELETE FROM changes WHERE seq <= ?", (seq - CHANGE_RETENTION,))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            self.local.writing = False
+        # Our own changes are already applied in this process
+        with self.sync_lock:
+            self.last_seq = max(self.last_seq, seq)
+
+    @staticmethod
+    def _write(connection, op):
+        if op['op'] == 'container':
+            connection.execute(
+                "INSERT INTO containers (container_id, record) VALUES (?, ?) "
+                "ON CONFLICT(container_id) DO UPDATE SET record = excluded.record",
+                (op['record']['containerId'], json.dumps(op['record'], default=str)))
+        elif op['op'] == 'item':
+            connection.execute(
+                "INSERT INTO items (item_id, record) VALUES (?, ?) "
+                "ON CONFLICT(item_id) DO UPDATE SET record = excluded.record",
+                (op['record']['itemId'], json.dumps(op['record'], default=str)))
+        elif op['op'] == 'remove':
+            connection.execute("DELETE FROM items WHERE item_id = ?", (op['itemId'],))
+        elif op['op'] == 'time':
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('currentTime', ?)",
+                               (op['currentTime'],))
+
+    def rollback(self):
+        if getattr(self.local, 'writing', False):
+            self.local.pending = []
+            self.local.writing = False
+            self.local.connection.execute("ROLLBACK")
@@ -0,0 +1,201 @@
+#rearrange.py
+"""Rearrangement planner for items the placement could not fit.
+
+When no container of an item's preferred zone has room for it, the planner
+looks for lower-priority items to take out of one of those containers and
+for somewhere else to put them: first their own preferred zone, then any
+other container. It only proposes moves; the station state is not touched.
+
+Every container the plan changes is worked on as a copy, and an attempt
+that cannot relocate all of its evicted items is dropped with its copies.
+Planning stops when the compute budget runs out, keeping the moves found so
+far, so a station-wide reshuffle still answers in bounded time.
+"""
+import time
+
+from packing import box_to_position, orientations
+
+
+def _box_dims(box):
+    return (box[3] - box[0], box[4] - box[1], box[5] - box[2])
+
+
+def _volume(dims):
+    return dims[0] * dims[1] * dims[2]
+
+
+class _Workspace:
+    """Copies of the containers changed by the plan, over the live spaces."""
+
+    def __init__(self, spaces):
+        self.spaces = spaces
+        self.committed = {}
+        self.trial = {}
+
+    def read(self, container_id):
+        for layer in (self.trial, self.committed):
+            if container_id in layer:
+                return layer[container_id]
+        return self.spaces[container_id]
+
+    def write(self, container_id):
+        if container_id not in self.trial:
+            self.trial[container_id] = self.read(container_id).copy()
+        return self.trial[container_id]
+
+    def keep(self):
+        self.committed.update(self.trial)
+        self.trial = {}
+
+    def drop(self):
+        self.trial = {}
+
+
+def plan_rearrangement(unplaced, spaces, zone_containers, item_info, budget):
+    """Propose moves that make room for unplaced items.
+
+    unplaced lists ``(item_id, dims, priority, zone)`` in packing order,
+    spaces maps every container id to its ContainerSpace, zone_containers(zone)
+    returns the container ids of a zone and item_info(item_id) returns
+    ``(priority, zone)`` of a placed item. budget is in seconds.
+
+    Returns ``(steps, complete)``: the move and place steps, numbered in the
+    order they have to be carried out, and whether every unplaced item was
+    considered before the budget ran out.
+    """
+    deadline = time.monotonic() + budget
+    workspace = _Workspace(spaces)
+    # Items already moved or placed by the plan stay where the plan puts them
+    settled = set()
+    steps = []
+
+    for item_id, dims, priority, zone in unplaced:
+        for container_id in zone_containers(zone):
+            if time.monotonic() >= deadline:
+                return steps, False
+            moves = _make_room(workspace, container_id, item_id, dims, priority,
+                               zone_containers, item_info, settled, deadline)
+            if moves is None:
+                workspace.drop()
+                continue
+            workspace.keep()
+            for step in moves:
+                step["step"] = len(steps) + 1
+                steps.append(step)
+                settled.add(step["itemId"])
+            break
+    return steps, True
+
+
+def _make_room(workspace, container_id, item_id, dims, priority,
+               zone_containers, item_info, settled, deadline):
+    """Moves evicting lower-priority items from container_id so item_id fits, or None."""
+    space = workspace.read(container_id)
+    box, evicted = _cheapest_spot(space, dims, priority, item_info, settled, deadline)
+    if box is None:
+        return None
+
+    space = workspace.write(container_id)
+    evicted = [(other_id, item_info(other_id)[1], space.boxes[other_id]) for other_id in evicted]
+    for other_id, _, _ in evicted:
+        space.remove(other_id)
+    space.add(item_id, box)
+
+    # Items leaving the container move straight to their new one. Items that
+    # stay in it are set aside until the new item is in, since their new
+    # spots may overlap the old ones of the others
+    moves = []
+    set_aside = []
+    for other_id, other_zone, old_box in evicted:
+        target = _relocate(workspace, other_id, _box_dims(old_box), other_zone, zone_containers, deadline)
+        if target is None:
+            return None
+        new_container_id, new_box = target
+        if new_container_id != container_id:
+            moves.append({
+                "action": "move",
+                "itemId": other_id,
+                "fromContainer": container_id,
+                "fromPosition": box_to_position(old_box),
+                "toContainer": new_container_id,
+                "toPosition": box_to_position(new_box)
+            })
+        elif new_box != old_box:
+            moves.append({
+                "action": "remove",
+                "itemId": other_id,
+                "fromContainer": container_id,
+                "fromPosition": box_to_position(old_box)
+            })
+            set_aside.append((other_id, new_box))
+    for placed_id, placed_box in [(item_id, box)] + set_aside:
+        moves.append({
+            "action": "place",
+            "itemId": placed_id,
+            "toContainer": container_id,
+            "toPosition": box_to_position(placed_box)
+        })
+    return moves
+
+
+def _cheapest_spot(space, dims, priority, item_info, settled, deadline):
+    """Box for an item of the given dims and the ids of the items it would displace.
+
+    Spots are tried at the corners of the free spaces and of the boxes held by
+    lower-priority items, in every rotation; a spot is usable when everything
+    it overlaps may be moved. The spot displacing the least important items,
+    then the least volume, wins. Returns (None, None) when there is none.
+    """
+    width, depth, height = space.dims
+    rotations = [o for o in orientations(dims) if o[0] <= width and o[1] <= depth and o[2] <= height]
+    if not rotations:
+        return None, None
+
+    # Whether an item may be moved for this one, and what moving it costs
+    movable = {}
+    for other_id, box in space.boxes.items():
+        if other_id not in settled:
+            other_priority = item_info(other_id)[0]
+            if other_priority < priority:
+                movable[other_id] = (other_priority, _volume(_box_dims(box)))
+    if not movable:
+        return None, None
+
+    corners = dict.fromkeys(space.boxes[other_id][:3] for other_id in movable)
+    if not space.dirty:
+        corners.update(dict.fromkeys(free[:3] for free in space.spaces))
+    best = best_cost = best_evicted = None
+    for count, (x, y, z) in enumerate(sorted(corners, key=lambda corner: (corner[1], corner[2], corner[0]))):
+        if count % 64 == 0 and time.monotonic() >= deadline:
+            break
+        for w, d, h in rotations:
+            box = (x, y, z, x + w, y + d, z + h)
+            if not space.in_bounds(box):
+                continue
+            evicted = space.collisions(box)
+            if not evicted or any(other_id not in movable for other_id in evicted):
+                continue
+            cost = (max(movable[other_id][0] for other_id in evicted),
+                    sum(movable[other_id][1] for other_id in evicted))
+            if best_cost is None or cost < best_cost:
+                best, best_cost, best_evicted = box, cost, evicted
+    return best, best_evicted
+
+
+def _relocate(workspace, item_id, dims, zone, zone_containers, deadline):
+    """Put an evicted item in its own zone if possible, else anywhere; returns (container id, box)."""
+    own_zone = zone_containers(zone)
+    in_zone = set(own_zone)
+    others = [container_id for container_id in workspace.spaces if container_id not in in_zone]
+    volume = _volume(dims)
+    for container_id in own_zone + others:
+        if time.monotonic() >= deadline:
+            return None
+        space = workspace.read(container_id)
+        if space.remaining_volume < volume:
+            continue
+        box = space.find(dims)
+        if box is not None:
+            workspace.write(container_id).add(item_id, box)
+            return container_id, box
+    return None
@@ -0,0 +1,42 @@
+#response_cache.py
+"""Cache of serialized GET responses, keyed by request and state version.
+
+An entry remembers the versions of the collections its response was built
+from; it is only served while those versions are unchanged, so nothing ever
+has to be invalidated explicitly: changed state simply stops matching and
+the entry ages out. Entries are evicted least recently used first once the
+cached bodies exceed the byte budget.
+"""
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, versions):
+        """The cached (body, mimetype) for key if it was built at versions, else None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != versions:
+                return None
+            self.entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def put(self, key, versions, body, mimetype):
+        # Bodies larger than a quarter of the budget would evict too much
+        if len(body) * 4 > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self.entries[key] = (versions, body, mimetype)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (_, evicted, _) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
@@ -0,0 +1,221 @@
+#search_index.py
+"""Inverted n-gram index behind the search API.
+
+Every searchable field is lowercased and broken into all of its 1, 2 and
+3 character grams. A query is answered by intersecting the postings of its
+grams (the rarest first) and then confirming the substring match on the few
+records left, so non-matching records are never touched. Records also carry
+an insertion sequence number so results come back in the same order as the
+underlying ``items``/``containers`` dicts, exactly like the old linear scan.
+The same numbers serve as pagination cursors: a page is "the next ``limit``
+matches after sequence N", which stays stable while records come and go.
+
+One lock guards the index, so searches from request threads never see a
+half-applied add or remove; every operation holds it only briefly.
+
+Bulk loads (startup recovery) can defer the gram postings: deferred records
+are listed and zone-filtered right away, and ``start_catch_up`` gives them
+their grams from a background thread, a batch at a time so searches and
+writers only ever wait for one batch. Until then text queries check the
+deferred records one by one.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from heapq import nsmallest
+
+GRAM_SIZE = 3
+# Deferred records given their grams per lock hold by the catch-up thread
+CATCH_UP_BATCH = 500
+
+
+def _grams(text, size):
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def _all_grams(text):
+    length = len(text)
+    return [text[i:i + size] for size in range(1, GRAM_SIZE + 1) for i in range(length - size + 1)]
+
+
+class TextIndex:
+    """Substring index over a few text fields plus a zone field.
+
+    With ``zone_substring`` the zone filter matches when the requested zone is
+    a substring of the record's zone (the item search semantics); otherwise
+    zones must be equal (the container search semantics).
+    """
+
+    def __init__(self, fields, zone_field, zone_substring=False):
+        self.fields = fields
+        self.zone_field = zone_field
+        self.zone_substring = zone_substring
+        self.postings = {}
+        self.zones = {}
+        self.records = {}
+        self.sequence = {}
+        self.order = []
+        self.keys_by_sequence = {}
+        self.next_sequence = 0
+        self.unindexed = set()
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, key, record, defer=False):
+        """Index record under key, replacing what was indexed for key before."""
+        with self.lock:
+            self._add(key, record, defer)
+
+    def _add(self, key, record, defer):
+        if key in self.records:
+            self._unindex(key)
+        else:
+            self.sequence[key] = self.next_sequence
+            self.order.append(self.next_sequence)
+            self.keys_by_sequence[self.next_sequence] = key
+            self.next_sequence += 1
+        texts = tuple(str(record.get(field) or '').lower() for field in self.fields)
+        zone = record.get(self.zone_field)
+        self.records[key] = (texts, zone)
+        self.zones.setdefault(zone, set()).add(key)
+        if defer:
+            self.unindexed.add(key)
+        else:
+            self._index_grams(key, texts)
+
+    def _index_grams(self, key, texts):
+        grams = set()
+        for text in texts:
+            grams.update(_all_grams(text))
+        postings = self.postings
+        for gram in grams:
+            members = postings.get(gram)
+            if members is None:
+                postings[gram] = {key}
+            else:
+                members.add(key)
+
+    def catch_up(self, limit=None):
+        """Index the grams of up to limit deferred records; returns how many are left."""
+        with self.lock:
+            count = 0
+            while self.unindexed and (limit is None or count < limit):
+                key = self.unindexed.pop()
+                self._index_grams(key, self.records[key][0])
+                count += 1
+            return len(self.unindexed)
+
+    def start_catch_up(self, batch=CATCH_UP_BATCH):
+        """Index the deferred records in batches of batch on a background thread."""
+        def run():
+            while self.catch_up(batch):
+                # Let waiting searches and writers have the lock
+                time.sleep(0.001)
+        thread = threading.Thread(target=run, name='search-catch-up', daemon=True)
+        thread.start()
+        return thread
+
+    def remove(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        if key in self.records:
+            self._unindex(key)
+            del self.records[key]
+            sequence = self.sequence.pop(key)
+            del self.order[bisect_left(self.order, sequence)]
+            del self.keys_by_sequence[sequence]
+
+    def _unindex(self, key):
+        texts, zone = self.records[key]
+        self._discard(self.zones, zone, key)
+        if key in self.unindexed:
+            self.unindexed.discard(key)
+            return
+        grams = set()
+        for text in texts:
+            grams.update(_all_grams(text))
+        for gram in grams:
+            self._discard(self.postings, gram, key)
+
+    @staticmethod
+    def _discard(postings, token, key):
+        members = postings.get(token)
+        if members is not None:
+            members.discard(key)
+            if not members:
+                del postings[token]
+
+    def search(self, query='', zone=None, after=None, limit=None):
+        """Keys matching a lowercased query and optional zone, in insertion order.
+
+        after skips records up to and including that sequence number and
+        limit caps how many keys come back.
+        """
+        with self.lock:
+            return [key for _, key in self._search(query, zone, after, limit)]
+
+    def page(self, query='', zone=None, after=None, limit=None):
+        """Like search, but returns (sequence, key) pairs for cursor paging."""
+        with self.lock:
+            return self._search(query, zone, after, limit)
+
+    def _search(self, query, zone, after, limit):
+        candidates = None
+        if query:
+            candidates = self._gram_matches(query)
+            # Records still waiting for their grams are checked directly
+            records = self.records
+            for key in self.unindexed:
+                for text in records[key][0]:
+                    if query in text:
+                        candidates.add(key)
+                        break
+            if not candidates:
+                return []
+
+        if zone:
+            in_zone = self._zone_members(zone)
+            candidates = in_zone if candidates is None else candidates & in_zone
+
+        if candidates is None:
+            start = 0 if after is None else bisect_right(self.order, after)
+            stop = len(self.order) if limit is None else start + limit
+            return [(sequence, self.keys_by_sequence[sequence]) for sequence in self.order[start:stop]]
+
+        if query and len(query) > GRAM_SIZE:
+            candidates = [key for key in candidates
+                          if any(query in text for text in self.records[key][0])]
+        sequence = self.sequence
+        pairs = [(sequence[key], key) for key in candidates]
+        if after is not None:
+            pairs = [pair for pair in pairs if pair[0] > after]
+        if limit is not None:
+            return nsmallest(limit, pairs)
+        pairs.sort()
+        return pairs
+
+    def _gram_matches(self, query):
+        size = min(len(query), GRAM_SIZE)
+        postings = [self.postings.get(gram) for gram in _grams(query, size)]
+        if not all(postings):
+            return set()
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for members in postings[1:]:
+            candidates &= members
+            if not candidates:
+                break
+        return candidates
+
+    def _zone_members(self, zone):
+        if not self.zone_substring:
+            return set(self.zones.get(zone, ()))
+        members = set()
+        for indexed_zone, keys in self.zones.items():
+            if indexed_zone and zone in indexed_zone:
+                members |= keys
+        return members
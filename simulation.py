@@ -0,0 +1,38 @@
+#simulation.py
+"""Day arithmetic for fast-forwarding the station clock.
+
+Day ``d`` (1-based) covers ``[start + (d - 1) days, start + d days)``. An item
+is used on day ``d`` only if it was not waste at the start of that day, and it
+counts as expired on the first day whose end is past its expiry date, which
+matches the ``current_time > expiry`` rule of the time API. With these rules
+every event day can be computed directly instead of stepping through days.
+"""
+from datetime import timedelta
+from math import ceil
+
+DAY = timedelta(days=1)
+
+
+def expiry_day(start, expiry):
+    """Day on which an item expiring at expiry is reported, at least day 1."""
+    return max(1, (expiry - start) // DAY + 1)
+
+
+def usage_outcome(start, days, uses_per_day, remaining_uses, expiry=None):
+    """Work out how one scheduled item fares over the next days.
+
+    remaining_uses of None means the item has no usage limit. Returns
+    ``(days_used, depletion_day)`` where depletion_day is None unless the item
+    runs out of uses within the horizon before it expires.
+    """
+    usable_days = days
+    if expiry is not None:
+        usable_days = 0 if expiry < start else min(days, expiry_day(start, expiry))
+
+    if remaining_uses is None:
+        return usable_days, None
+
+    depletion = ceil(remaining_uses / uses_per_day) if remaining_uses > 0 else 1
+    if depletion <= usable_days:
+        return depletion, depletion
+    return usable_days, None
@@ -0,0 +1,205 @@
+#spatial.py
+"""Box index used for collision checks inside a container.
+
+Boxes are hashed into a uniform 3D grid of cubic cells. An overlap query only
+looks at the boxes registered in the cells the query box covers, so its cost
+depends on how crowded that neighbourhood is rather than on how many items the
+container holds. Boxes use the same ``(x1, y1, z1, x2, y2, z2)`` tuples as
+packing.py; boxes that merely touch do not overlap. The grid is filled in one
+pass on the first query, so loading a container costs nothing until somebody
+looks for a collision in it.
+
+``BlockingGraph`` sits on top of the index and records which items stand in
+the way of which: items come out through the open face (depth 0), so an item
+is blocked by every item that overlaps the column between it and that face.
+"""
+from math import floor, ceil
+
+DEFAULT_CELL_SIZE = 10
+CELLS_PER_SIDE = 16
+# Boxes covering more cells than this are kept aside and checked directly
+MAX_CELLS_PER_BOX = 512
+
+
+def cell_size_for(dims):
+    """Grid cell size giving about CELLS_PER_SIDE cells along the longest finite side."""
+    finite = [side for side in dims if side != float('inf') and side > 0]
+    if not finite:
+        return DEFAULT_CELL_SIZE
+    return max(finite) / CELLS_PER_SIDE
+
+
+def boxes_overlap(a, b):
+    return (a[0] < b[3] and b[0] < a[3] and
+            a[1] < b[4] and b[1] < a[4] and
+            a[2] < b[5] and b[2] < a[5])
+
+
+class BoxIndex:
+    """Uniform-grid index of the boxes held by one container."""
+
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.built = False
+        self.cells = {}
+        self.large = set()
+        self.boxes = {}
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def copy(self):
+        clone = BoxIndex(self.cell_size)
+        clone.boxes = dict(self.boxes)
+        if self.built:
+            clone.built = True
+            clone.cells = {cell: set(members) for cell, members in self.cells.items()}
+            clone.large = set(self.large)
+        return clone
+
+    def build(self):
+        """Put every box in the grid."""
+        for key, box in self.boxes.items():
+            self._place(key, box)
+        self.built = True
+
+    def _ranges(self, box):
+        size = self.cell_size
+        ranges = []
+        for axis in range(3):
+            low = floor(box[axis] / size)
+            high = max(low, ceil(box[axis + 3] / size) - 1)
+            ranges.append(range(low, high + 1))
+        return ranges
+
+    def _cells(self, ranges):
+        return [(i, j, k) for i in ranges[0] for j in ranges[1] for k in ranges[2]]
+
+    @staticmethod
+    def _count(ranges):
+        return len(ranges[0]) * len(ranges[1]) * len(ranges[2])
+
+    def insert(self, key, box):
+        self.remove(key)
+        self.boxes[key] = box
+        if self.built:
+            self._place(key, box)
+
+    def _place(self, key, box):
+        ranges = self._ranges(box)
+        if self._count(ranges) > MAX_CELLS_PER_BOX:
+            self.large.add(key)
+            return
+        for cell in self._cells(ranges):
+            self.cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key):
+        box = self.boxes.pop(key, None)
+        if box is None or not self.built:
+            return
+        if key in self.large:
+            self.large.discard(key)
+            return
+        for cell in self._cells(self._ranges(box)):
+            members = self.cells[cell]
+            members.discard(key)
+            if not members:
+                del self.cells[cell]
+
+    def overlapping(self, box, exclude=None):
+        """Keys of the boxes that overlap box, ignoring the key exclude."""
+        if not self.built:
+            self.build()
+        ranges = self._ranges(box)
+        if self._count(ranges) > len(self.boxes):
+            candidates = self.boxes
+        else:
+            candidates = set(self.large)
+            for cell in self._cells(ranges):
+                candidates.update(self.cells.get(cell, ()))
+        return [key for key in candidates
+                if key != exclude and boxes_overlap(box, self.boxes[key])]
+
+
+class BlockingGraph:
+    """Which items block which, built on first use and then kept up to date.
+
+    An item blocks another when it overlaps the space the other item sweeps
+    through on its way out to the open face. The graph of a container is
+    built in one pass the first time it is queried, so bulk loads and
+    packing never pay for containers nobody retrieves from. From then on
+    the relation only depends on the two boxes, so adding or removing one
+    item only touches its own edges: two overlap queries per add instead
+    of a scan per retrieval.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.built = False
+        self.blockers = {}
+        self.blocked = {}
+        # Deepest box end seen so far, bounds the query behind a new box
+        self.depth = 0
+
+    def copy(self, index):
+        """A copy of the graph over index, a copy of this graph's index."""
+        clone = BlockingGraph(index)
+        if self.built:
+            clone.built = True
+            clone.blockers = {key: set(others) for key, others in self.blockers.items()}
+            clone.blocked = {key: set(others) for key, others in self.blocked.items()}
+            clone.depth = self.depth
+        return clone
+
+    def build(self):
+        """Work out the edges of every box in the index, one query per box."""
+        boxes = self.index.boxes
+        self.blockers = {key: set() for key in boxes}
+        self.blocked = {key: set() for key in boxes}
+        self.depth = max((box[4] for box in boxes.values()), default=0)
+        for key, box in boxes.items():
+            front = (box[0], 0, box[2], box[3], box[1], box[5])
+            for other in self.index.overlapping(front, key):
+                self.blockers[key].add(other)
+                self.blocked[other].add(key)
+        self.built = True
+
+    def add(self, key, box):
+        """Record the edges of a box that has just been inserted in the index."""
+        if not self.built:
+            return
+        self.depth = max(self.depth, box[4])
+        front = (box[0], 0, box[2], box[3], box[1], box[5])
+        behind = (box[0], box[4], box[2], box[3], self.depth, box[5])
+        blockers = set(self.index.overlapping(front, key))
+        blocked = set(self.index.overlapping(behind, key)) if box[4] < self.depth else set()
+        self.blockers[key] = blockers
+        self.blocked[key] = blocked
+        for other in blockers:
+            self.blocked[other].add(key)
+        for other in blocked:
+            self.blockers[other].add(key)
+
+    def remove(self, key):
+        for other in self.blockers.pop(key, ()):
+            self.blocked[other].discard(key)
+        for other in self.blocked.pop(key, ()):
+            self.blockers[other].discard(key)
+
+    def removal_order(self, key):
+        """Items to take out before key, in an order in which each one is free to move.
+
+        Blockers of blockers are included. A blocker always starts nearer the
+        open face than the item it blocks, so sorting by depth is a valid order.
+        """
+        if not self.built:
+            self.build()
+        seen = set()
+        stack = [key]
+        while stack:
+            for other in self.blockers.get(stack.pop(), ()):
+                if other not in seen:
+                    seen.add(other)
+                    stack.append(other)
+        boxes = self.index.boxes
+        return sorted(seen, key=lambda other: (boxes[other][1], boxes[other][2], boxes[other][0], str(other)))
@@ -3,14 +3,25 @@ import unittest
 import json
 import requests
 import time
+import threading
+from datetime import datetime, timedelta
 
 # Base URL for API endpoints
 BASE_URL = "http://localhost:8000"
 
 class TestSpaceStationCargoAPIs(unittest.TestCase):
-    def setUp(self):
+    @classmethod
+    def setUpClass(cls):
         # Wait for the server to start
-        time.sleep(1)
+        deadline = time.time() + 30
+        while True:
+            try:
+                requests.get(f"{BASE_URL}/health", timeout=1)
+                return
+            except requests.ConnectionError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.2)
         
     def test_health_check(self):
         response = requests.get(f"{BASE_URL}/health")
@@ -57,6 +68,103 @@ class TestSpaceStationCargoAPIs(unittest.TestCase):
         self.assertEqual(data["placements"][0]["itemId"], "item001")
         self.assertEqual(data["placements"][0]["containerId"], "container001")
         
+    def test_placement_packing(self):
+        # Two items that only fit side by side, one of them only when rotated
+        test_data = {
+            "items": [
+                {
+                    "itemId": "item101",
+                    "name": "Battery Pack",
+                    "width": 4,
+                    "depth": 2,
+                    "height": 2,
+                    "preferredZone": "P"
+                },
+                {
+                    "itemId": "item102",
+                    "name": "Antenna Segment",
+                    "width": 2,
+                    "depth": 2,
+                    "height": 4,
+                    "preferredZone": "P"
+                },
+                {
+                    "itemId": "item103",
+                    "name": "Oversized Panel",
+                    "width": 9,
+                    "depth": 9,
+                    "height": 9,
+                    "preferredZone": "P"
+                }
+            ],
+            "containers": [
+                {
+                    "containerId": "container101",
+                    "name": "Narrow Locker",
+                    "width": 8,
+                    "depth": 2,
+                    "height": 2,
+                    "zone": "P"
+                }
+            ]
+        }
+        response = requests.post(f"{BASE_URL}/api/placement", json=test_data)
+        
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data["success"])
+        placed = {p["itemId"]: p["position"] for p in data["placements"]}
+        self.assertEqual(set(placed), {"item101", "item102"})
+        
+        # Placements stay inside the container and do not overlap
+        first, second = placed["item101"], placed["item102"]
+        for position in (first, second):
+            for start, end, limit in zip(position["startCoordinates"], position["endCoordinates"], [8, 2, 2]):
+                self.assertGreaterEqual(start, 0)
+                self.assertLessEqual(end, limit)
+        self.assertTrue(
+            first["endCoordinates"][0] <= second["startCoordinates"][0] or
+            second["endCoordinates"][0] <= first["startCoordinates"][0]
+        )
+        
+    def test_placement_rearrangement(self):
+        # Two low-priority items fill the only container of zone T
+        setup_data = {
+            "containers": [
+                {"containerId": "container231", "zone": "T", "width": 10, "depth": 10, "height": 10},
+                {"containerId": "container232", "zone": "U", "width": 10, "depth": 10, "height": 10}
+            ],
+            "items": [
+                {"itemId": "item231", "preferredZone": "T", "width": 10, "depth": 10, "height": 5, "priority": 1},
+                {"itemId": "item232", "preferredZone": "T", "width": 10, "depth": 10, "height": 5, "priority": 2}
+            ]
+        }
+        requests.post(f"{BASE_URL}/api/placement", json=setup_data)
+        
+        # A more important item does not fit, so moving the least important one is proposed
+        response = requests.post(f"{BASE_URL}/api/placement", json={"items": [
+            {"itemId": "item233", "preferredZone": "T", "width": 10, "depth": 10, "height": 5, "priority": 9}
+        ]})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertNotIn("item233", [placement["itemId"] for placement in data["placements"]])
+        steps = [(step["action"], step["itemId"]) for step in data["rearrangements"]
+                 if step["itemId"] in ("item231", "item232", "item233")]
+        self.assertEqual(steps, [("move", "item231"), ("place", "item233")])
+        self.assertTrue(data["rearrangementComplete"])
+        
+        # Nothing was moved yet, it is only a proposal
+        response = requests.get(f"{BASE_URL}/api/retrieve/plan", params={"itemId": "item231"})
+        self.assertEqual(response.json()["containerId"], "container231")
+
+        # An invalid budget is rejected before anything is placed
+        response = requests.post(f"{BASE_URL}/api/placement", json={"rearrangementBudgetMs": "100", "items": [
+            {"itemId": "item234", "preferredZone": "U", "width": 1, "depth": 1, "height": 1}
+        ]})
+        self.assertEqual(response.status_code, 400)
+        response = requests.get(f"{BASE_URL}/api/search", params={"query": "item234"})
+        self.assertEqual(response.json()["results"]["items"], [])
+
     def test_search_api(self):
         # First place an item (setup)
         setup_data = {
@@ -91,6 +199,55 @@ class TestSpaceStationCargoAPIs(unittest.TestCase):
         self.assertGreaterEqual(len(data["results"]["items"]), 1)
         self.assertGreaterEqual(len(data["results"]["containers"]), 1)
         
+    def test_search_pagination(self):
+        setup_data = {
+            "items": [
+                {"itemId": f"item4{i:02d}", "name": "Sample Vial", "description": "Biology sample", "preferredZone": "Lab"}
+                for i in range(5)
+            ]
+        }
+        requests.post(f"{BASE_URL}/api/import", json=setup_data)
+        
+        # Walk every page of two items, only pulling the name column
+        found = []
+        cursor = None
+        while True:
+            params = {"query": "sample vial", "type": "item", "limit": 2, "fields": "name"}
+            if cursor:
+                params["cursor"] = cursor
+            response = requests.get(f"{BASE_URL}/api/search", params=params)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertLessEqual(len(data["results"]["items"]), 2)
+            for item in data["results"]["items"]:
+                self.assertEqual(set(item), {"itemId", "name"})
+                found.append(item["itemId"])
+            cursor = data["nextCursor"]
+            if not cursor:
+                break
+        self.assertEqual(found, [f"item4{i:02d}" for i in range(5)])
+        
+        response = requests.get(f"{BASE_URL}/api/search", params={"limit": 0})
+        self.assertEqual(response.status_code, 400)
+        
+    def test_search_after_waste(self):
+        setup_data = {
+            "items": [
+                {"itemId": "item301", "name": "Expired Antibiotics", "description": "Crew pharmacy", "preferredZone": "Medbay"}
+            ]
+        }
+        requests.post(f"{BASE_URL}/api/import", json=setup_data)
+        
+        response = requests.get(f"{BASE_URL}/api/search?query=antibio&type=item&zone=Med")
+        found = [item["itemId"] for item in response.json()["results"]["items"]]
+        self.assertIn("item301", found)
+        
+        # Wasted items disappear from search results
+        requests.post(f"{BASE_URL}/api/waste", json={"itemId": "item301"})
+        response = requests.get(f"{BASE_URL}/api/search?query=antibio&type=item")
+        found = [item["itemId"] for item in response.json()["results"]["items"]]
+        self.assertNotIn("item301", found)
+        
     def test_retrieve_api(self):
         # First place an item (setup)
         setup_data = {
@@ -126,6 +283,37 @@ class TestSpaceStationCargoAPIs(unittest.TestCase):
         self.assertEqual(data["retrieval"]["itemId"], "item003")
         self.assertEqual(data["retrieval"]["containerId"], "container003")
         
+    def test_retrieval_plan(self):
+        setup_data = {
+            "items": [
+                {"itemId": f"item22{i}", "name": f"Filter {i}", "width": 3, "depth": 3, "height": 3}
+                for i in range(3)
+            ],
+            "containers": [
+                {"containerId": "container221", "name": "Filter Rack",
+                 "width": 10, "depth": 10, "height": 10, "zone": "S"}
+            ]
+        }
+        requests.post(f"{BASE_URL}/api/import", json=setup_data)
+        # item220 sits in front of item221, item222 is off to the side
+        requests.post(f"{BASE_URL}/api/place/batch", json={"operations": [
+            {"itemId": "item220", "containerId": "container221", "coordinates": [0, 0, 0]},
+            {"itemId": "item221", "containerId": "container221", "coordinates": [1, 4, 1]},
+            {"itemId": "item222", "containerId": "container221", "coordinates": [5, 0, 0]}
+        ]})
+        
+        response = requests.get(f"{BASE_URL}/api/retrieve/plan", params={"itemId": "item221"})
+        self.assertEqual(response.status_code, 200)
+        steps = [(step["action"], step["itemId"]) for step in response.json()["retrievalSteps"]]
+        self.assertEqual(steps, [("remove", "item220"), ("setAside", "item220"),
+                                 ("retrieve", "item221"), ("placeBack", "item220")])
+        
+        # Nothing stands in front of item222
+        response = requests.post(f"{BASE_URL}/api/retrieve", json={"itemId": "item221"})
+        self.assertEqual(len(response.json()["retrieval"]["retrievalSteps"]), 4)
+        response = requests.get(f"{BASE_URL}/api/retrieve/plan", params={"itemId": "item222"})
+        self.assertEqual([step["action"] for step in response.json()["retrievalSteps"]], ["retrieve"])
+        
     def test_place_api(self):
         # First create an item and container (setup)
         setup_data = {
@@ -166,6 +354,91 @@ class TestSpaceStationCargoAPIs(unittest.TestCase):
         self.assertEqual(data["placement"]["containerId"], "container004")
         self.assertEqual(data["placement"]["position"]["startCoordinates"], [1, 1, 0])
         
+    def test_place_collision_checks(self):
+        # Import items without placing them
+        setup_data = {
+            "items": [
+                {"itemId": "item201", "name": "Spare Fan", "width": 3, "depth": 3, "height": 3},
+                {"itemId": "item202", "name": "Spare Pump", "width": 3, "depth": 3, "height": 3}
+            ],
+            "containers": [
+                {
+                    "containerId": "container201",
+                    "name": "Spares Rack",
+                    "width": 10,
+                    "depth": 10,
+                    "height": 10,
+                    "zone": "Q"
+                }
+            ]
+        }
+        requests.post(f"{BASE_URL}/api/import", json=setup_data)
+        
+        response = requests.post(f"{BASE_URL}/api/place", json={
+            "itemId": "item201", "containerId": "container201", "coordinates": [0, 0, 0]
+        })
+        self.assertEqual(response.status_code, 200)
+        
+        # Overlapping the first item is rejected
+        response = requests.post(f"{BASE_URL}/api/place", json={
+            "itemId": "item202", "containerId": "container201", "coordinates": [1, 1, 1]
+        })
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(response.json()["success"])
+        
+        # Sticking out of the container is rejected
+        response = requests.post(f"{BASE_URL}/api/place", json={
+            "itemId": "item202", "containerId": "container201", "coordinates": [8, 0, 0]
+        })
+        self.assertEqual(response.status_code, 400)
+        
+        # Once the first item is retrieved its space is free again
+        requests.post(f"{BASE_URL}/api/retrieve", json={"itemId": "item201"})
+        response = requests.post(f"{BASE_URL}/api/place", json={
+            "itemId": "item202", "containerId": "container201", "coordinates": [1, 1, 1]
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["success"])
+        
+    def test_batch_operations(self):
+        setup_data = {
+            "items": [
+                {"itemId": f"item21{i}", "name": "Sample Tube", "width": 2, "depth": 2, "height": 2}
+                for i in range(3)
+            ],
+            "containers": [
+                {"containerId": "container211", "name": "Sample Rack",
+                 "width": 10, "depth": 10, "height": 10, "zone": "R"}
+            ]
+        }
+        requests.post(f"{BASE_URL}/api/import", json=setup_data)
+        
+        # Each operation succeeds or fails on its own
+        response = requests.post(f"{BASE_URL}/api/place/batch", json={"operations": [
+            {"itemId": "item210", "containerId": "container211", "coordinates": [0, 0, 0]},
+            {"itemId": "item211", "containerId": "container211", "coordinates": [1, 1, 1]},
+            {"itemId": "item212", "containerId": "container211", "coordinates": [4, 0, 0]}
+        ]})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["applied"], data["failed"]), (2, 1))
+        self.assertEqual(data["results"][1]["status"], 409)
+        
+        # With allOrNothing one failure undoes the rest
+        response = requests.post(f"{BASE_URL}/api/retrieve/batch", json={"allOrNothing": True, "operations": [
+            {"itemId": "item210"},
+            {"itemId": "item211"}
+        ]})
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(response.json()["results"][0]["rolledBack"])
+        response = requests.post(f"{BASE_URL}/api/retrieve", json={"itemId": "item210"})
+        self.assertEqual(response.json()["retrieval"]["containerId"], "container211")
+        
+        response = requests.post(f"{BASE_URL}/api/waste/batch", json={"operations": [
+            {"itemId": "item210"}, {"itemId": "item212"}
+        ]})
+        self.assertEqual(response.json()["applied"], 2)
+        
     def test_waste_management_api(self):
         # First create an item (setup)
         setup_data = {
@@ -192,6 +465,43 @@ class TestSpaceStationCargoAPIs(unittest.TestCase):
         self.assertEqual(data["wasteManagement"]["itemId"], "item005")
         self.assertEqual(data["wasteManagement"]["status"], "removed")
         
+    def test_waste_return_plan(self):
+        # Waste is told apart from other tests' waste by its value
+        setup_data = {
+            "containers": [
+                {"containerId": "container241", "zone": "V", "width": 10, "depth": 10, "height": 10},
+                {"containerId": "container242", "zone": "Undock", "width": 10, "depth": 10, "height": 10}
+            ],
+            "items": [
+                {"itemId": "item241", "width": 2, "depth": 2, "height": 2, "mass": 5, "value": 10, "status": "expired"},
+                {"itemId": "item242", "width": 3, "depth": 3, "height": 3, "mass": 5, "value": 10, "status": "expired"},
+                {"itemId": "item243", "width": 4, "depth": 4, "height": 4, "mass": 9, "value": 16, "status": "expired"},
+                {"itemId": "item244", "width": 1, "depth": 1, "height": 1, "mass": 1, "value": 5, "status": "depleted"},
+                {"itemId": "item245", "width": 2, "depth": 2, "height": 2, "mass": 1}
+            ]
+        }
+        requests.post(f"{BASE_URL}/api/import", json=setup_data)
+        # item245 is not waste but stands in front of item244
+        requests.post(f"{BASE_URL}/api/place/batch", json={"operations": [
+            {"itemId": "item245", "containerId": "container241", "coordinates": [0, 0, 0]},
+            {"itemId": "item244", "containerId": "container241", "coordinates": [0, 3, 0]}
+        ]})
+        
+        response = requests.post(f"{BASE_URL}/api/waste/return-plan", json={
+            "undockingContainerId": "container242", "maxWeight": 10, "objective": "value"
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([step["itemId"] for step in data["returnPlan"]], ["item243", "item244"])
+        self.assertEqual(data["returnManifest"]["totalWeight"], 10)
+        self.assertIn(("remove", "item245"), [(step["action"], step["itemId"]) for step in data["retrievalSteps"]])
+        self.assertIn("item241", data["leftBehind"])
+        
+        response = requests.post(f"{BASE_URL}/api/waste/return-plan", json={
+            "undockingContainerId": "container242", "maxWeight": -1
+        })
+        self.assertEqual(response.status_code, 400)
+        
     def test_time_simulation_api(self):
         # Advance time by 24 hours
         time_data = {
@@ -205,6 +515,61 @@ class TestSpaceStationCargoAPIs(unittest.TestCase):
         self.assertTrue(data["success"])
         self.assertEqual(data["timeSimulation"]["hoursAdvanced"], 24)
         
+    def test_time_expiry_reported_once(self):
+        setup_data = {
+            "items": [
+                {
+                    "itemId": "item501",
+                    "name": "Fresh Fruit",
+                    "perishable": True,
+                    "expiryDate": (datetime.now() + timedelta(days=5)).isoformat()
+                }
+            ]
+        }
+        requests.post(f"{BASE_URL}/api/import", json=setup_data)
+        
+        # Jump well past the expiry date
+        response = requests.post(f"{BASE_URL}/api/time", json={"hours": 24 * 30})
+        self.assertEqual(response.status_code, 200)
+        affected = [entry["itemId"] for entry in response.json()["timeSimulation"]["affectedItems"]]
+        self.assertIn("item501", affected)
+        
+        # Already expired items are not reported again
+        response = requests.post(f"{BASE_URL}/api/time", json={"hours": 1})
+        affected = [entry["itemId"] for entry in response.json()["timeSimulation"]["affectedItems"]]
+        self.assertNotIn("item501", affected)
+        
+    def test_time_fast_forward_days(self):
+        setup_data = {
+            "items": [
+                {"itemId": "item601", "name": "Wet Wipes", "usageLimit": 5},
+                {"itemId": "item602", "name": "Reusable Towel"}
+            ]
+        }
+        requests.post(f"{BASE_URL}/api/import", json=setup_data)
+        
+        # Two wipes a day run out on day 3
+        time_data = {
+            "numOfDays": 10,
+            "itemsToBeUsedPerDay": [{"itemId": "item601"}, {"itemId": "item601"}, {"itemId": "item602"}]
+        }
+        response = requests.post(f"{BASE_URL}/api/time", json=time_data)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data["success"])
+        simulation = data["timeSimulation"]
+        self.assertEqual(simulation["daysAdvanced"], 10)
+        
+        depleted = [(day["day"], entry["itemId"]) for day in simulation["wasteByDay"]
+                    for entry in day["items"] if entry["reason"] == "depleted"]
+        self.assertIn((3, "item601"), depleted)
+        self.assertNotIn("item602", [item_id for _, item_id in depleted])
+        
+        used = {entry["itemId"]: entry for entry in simulation["itemsUsed"]}
+        self.assertEqual(used["item601"]["usesConsumed"], 5)
+        self.assertEqual(used["item601"]["remainingUses"], 0)
+        self.assertEqual(used["item602"]["usesConsumed"], 10)
+        
     def test_import_export_api(self):
         # Import data
         import_data = {
@@ -243,6 +608,133 @@ class TestSpaceStationCargoAPIs(unittest.TestCase):
         self.assertTrue("containers" in data["export"])
         self.assertTrue("items" in data["export"])
         
+    def test_import_csv_and_ndjson(self):
+        csv_body = (
+            "Item ID,Name,Width (cm),Depth (cm),Height (cm),Mass (kg),Priority (1-100),Preferred Zone\n"
+            "item901,Solar Cell,10,10,2,1,60,Power\n"
+            "item902,Broken Row,wide,10,2,1,60,Power\n"
+        )
+        response = requests.post(f"{BASE_URL}/api/import", data=csv_body.encode(),
+                                 headers={"Content-Type": "text/csv"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data["success"])
+        self.assertEqual(data["import"]["itemsImported"], 1)
+        self.assertEqual(data["import"]["rowsRejected"], 1)
+        self.assertEqual(data["import"]["errors"][0]["row"], 3)
+        
+        ndjson_body = (
+            '{"containerId": "container901", "name": "Power Locker", "zone": "Power", "width": 20, "depth": 20, "height": 20}\n'
+            '{"itemId": "item903", "name": "Inverter", "preferredZone": "Power"}\n'
+        )
+        response = requests.post(f"{BASE_URL}/api/import", data=ndjson_body.encode(),
+                                 headers={"Content-Type": "application/x-ndjson"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["import"]["containersImported"], 1)
+        self.assertEqual(data["import"]["itemsImported"], 1)
+        
+        response = requests.get(f"{BASE_URL}/api/search", params={"query": "item901", "type": "item"})
+        item = response.json()["results"]["items"][0]
+        self.assertEqual(item["width"], 10)
+        self.assertEqual(item["preferredZone"], "Power")
+        
+    def test_streamed_export(self):
+        setup_data = {
+            "items": [{"itemId": "item951", "name": "Export Probe", "width": 1, "depth": 1, "height": 1, "preferredZone": "X"}],
+            "containers": [{"containerId": "container951", "name": "Export Bay", "zone": "X", "width": 5, "depth": 5, "height": 5}]
+        }
+        requests.post(f"{BASE_URL}/api/placement", json=setup_data)
+        
+        response = requests.get(f"{BASE_URL}/api/export", params={"format": "csv"}, stream=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["Content-Type"].startswith("text/csv"))
+        lines = response.text.splitlines()
+        self.assertTrue(lines[0].startswith("Item ID,Container ID"))
+        self.assertIn('item951,container951,"(0,0,0)","(1,1,1)"', lines)
+        
+        response = requests.get(f"{BASE_URL}/api/export", params={"format": "ndjson", "type": "items"}, stream=True)
+        self.assertEqual(response.status_code, 200)
+        records = [json.loads(line) for line in response.iter_lines() if line]
+        self.assertIn("item951", [record["itemId"] for record in records])
+        
+    def test_metrics(self):
+        requests.get(f"{BASE_URL}/health")
+        requests.post(f"{BASE_URL}/api/placement", json={"items": []})
+        
+        response = requests.get(f"{BASE_URL}/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+        text = response.text
+        self.assertIn('cargo_http_requests_total{route="/health",method="GET",status="200"}', text)
+        self.assertIn('cargo_http_request_duration_seconds_bucket{route="/api/placement",method="POST",le="+Inf"}', text)
+        self.assertIn("cargo_placement_batch_items_count", text)
+        for gauge in ("cargo_items", "cargo_containers", "cargo_log_entries"):
+            self.assertRegex(text, rf"\n{gauge} \d+\n")
+        
+    def test_versioned_responses(self):
+        response = requests.get(f"{BASE_URL}/api/export", params={"type": "containers"})
+        etag = response.headers["ETag"]
+        version = requests.get(f"{BASE_URL}/api/version").json()["collections"]["containers"]
+        
+        # Nothing changed, so the client's copy is still good
+        response = requests.get(f"{BASE_URL}/api/export", params={"type": "containers"},
+                                headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        
+        # Items do not matter to a containers export
+        requests.post(f"{BASE_URL}/api/import", json={"items": [{"itemId": "item251", "name": "Spare Bolt"}]})
+        response = requests.get(f"{BASE_URL}/api/export", params={"type": "containers"},
+                                headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        
+        requests.post(f"{BASE_URL}/api/import", json={"containers": [{"containerId": "container251", "zone": "W"}]})
+        self.assertGreater(requests.get(f"{BASE_URL}/api/version").json()["collections"]["containers"], version)
+        response = requests.get(f"{BASE_URL}/api/export", params={"type": "containers"},
+                                headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertIn("container251", [container["containerId"] for container in response.json()["export"]["containers"]])
+        
+    def test_change_feed(self):
+        response = requests.get(f"{BASE_URL}/api/changes", params={"since": 0, "limit": 1})
+        feed = response.json()
+        self.assertEqual(response.status_code, 200)
+        # Follow the feed to its end
+        since = feed["next"]
+        while feed["hasMore"]:
+            feed = requests.get(f"{BASE_URL}/api/changes", params={"since": since, "feedId": feed["feedId"]}).json()
+            since = feed["next"]
+        
+        requests.post(f"{BASE_URL}/api/import", json={
+            "containers": [{"containerId": "container261", "zone": "X", "width": 10, "depth": 10, "height": 10}],
+            "items": [{"itemId": f"item26{i}", "name": "Spare Valve", "width": 2, "depth": 2, "height": 2}
+                      for i in range(2)]
+        })
+        requests.post(f"{BASE_URL}/api/place", json={
+            "itemId": "item260", "containerId": "container261", "coordinates": [0, 0, 0]
+        })
+        requests.post(f"{BASE_URL}/api/waste", json={"itemId": "item261"})
+        
+        response = requests.get(f"{BASE_URL}/api/changes", params={"since": since, "feedId": feed["feedId"]})
+        data = response.json()
+        # Only what changed comes back, each record once with its latest state
+        changed = {(change["type"], change["id"]): change for change in data["changes"]}
+        self.assertEqual(set(changed), {("container", "container261"), ("item", "item260"), ("item", "item261")})
+        self.assertEqual(changed[("item", "item260")]["record"]["containerId"], "container261")
+        self.assertEqual(changed[("item", "item261")]["action"], "remove")
+        self.assertEqual(requests.get(f"{BASE_URL}/api/changes", params={"since": data["next"]}).json()["changes"], [])
+        
+        # A feed id from another process means starting over
+        response = requests.get(f"{BASE_URL}/api/changes", params={"since": since, "feedId": "elsewhere"})
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.json()["resync"])
+
+        # Invalid parameters are rejected rather than read as the start of the feed
+        for params in ({"since": "abc"}, {"since": -1}, {"since": 0, "limit": "all"}, {"since": 0, "limit": 0}):
+            response = requests.get(f"{BASE_URL}/api/changes", params=params)
+            self.assertEqual(response.status_code, 400)
+
     def test_logs_api(self):
         # Get logs
         response = requests.get(f"{BASE_URL}/api/logs")
@@ -261,5 +753,61 @@ class TestSpaceStationCargoAPIs(unittest.TestCase):
         self.assertTrue(data["success"])
         self.assertLessEqual(len(data["logs"]), 5)
 
+    def test_logs_filters(self):
+        setup_data = {
+            "items": [{"itemId": "item801", "name": "Logged Item", "preferredZone": "L"}],
+            "containers": [{"containerId": "container801", "name": "Log Locker", "zone": "L"}]
+        }
+        requests.post(f"{BASE_URL}/api/placement", json=setup_data)
+        requests.post(f"{BASE_URL}/api/retrieve", json={"itemId": "item801", "userId": "astronaut7"})
+        
+        response = requests.get(f"{BASE_URL}/api/logs", params={"itemId": "item801"})
+        self.assertEqual(response.status_code, 200)
+        actions = [log["action"] for log in response.json()["logs"]]
+        self.assertEqual(actions, ["PLACEMENT", "RETRIEVE"])
+        
+        response = requests.get(f"{BASE_URL}/api/logs", params={"userId": "astronaut7", "action": "RETRIEVE"})
+        logs = response.json()["logs"]
+        self.assertGreaterEqual(len(logs), 1)
+        self.assertTrue(all(log["userId"] == "astronaut7" for log in logs))
+        
+        # A time range in the future matches nothing
+        future = (datetime.now() + timedelta(days=1)).isoformat()
+        response = requests.get(f"{BASE_URL}/api/logs", params={"itemId": "item801", "startDate": future})
+        self.assertEqual(response.json()["logs"], [])
+        
+        response = requests.get(f"{BASE_URL}/api/logs", params={"startDate": "not-a-date"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_reads_during_writes(self):
+        setup_data = {
+            "containers": [{"containerId": f"container98{i}", "zone": "Concurrency",
+                            "width": 20, "depth": 20, "height": 20} for i in range(5)]
+        }
+        requests.post(f"{BASE_URL}/api/import", json=setup_data)
+        lines = "".join(json.dumps({"itemId": f"item98{i:03d}", "name": "Concurrent Crate", "width": 2,
+                                    "depth": 2, "height": 2, "preferredZone": "Concurrency"}) + "\n"
+                        for i in range(1000))
+        
+        def write():
+            requests.post(f"{BASE_URL}/api/import", data=lines,
+                          headers={"Content-Type": "application/x-ndjson"})
+            requests.post(f"{BASE_URL}/api/placement", json={})
+        writer = threading.Thread(target=write)
+        writer.start()
+        
+        # Readers keep working while the writes run and never see half-placed items
+        while writer.is_alive():
+            response = requests.get(f"{BASE_URL}/api/search", params={"query": "concurrent crate", "type": "item"})
+            self.assertEqual(response.status_code, 200)
+            response = requests.get(f"{BASE_URL}/api/export", params={"type": "items"})
+            self.assertEqual(response.status_code, 200)
+            for item in response.json()["export"]["items"]:
+                self.assertEqual(item.get("containerId") is None, item.get("position") is None)
+        writer.join()
+        
+        response = requests.get(f"{BASE_URL}/api/search", params={"query": "concurrent crate", "type": "item"})
+        self.assertEqual(len(response.json()["results"]["items"]), 1000)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,53 @@
+#test_changefeed.py
+import unittest
+
+from changefeed import ChangeFeed, COMPACT_SLACK
+
+
+class TestChangeFeed(unittest.TestCase):
+    def test_pages_skip_superseded_changes(self):
+        feed = ChangeFeed(capacity=10)
+        feed.record("items", "i1")
+        feed.record("items", "i2")
+        feed.record("items", "i1")
+        feed.record("containers", "c1", removed=True)
+
+        self.assertEqual(feed.since(0), ([(2, "items", "i2", False), (3, "items", "i1", False),
+                                          (4, "containers", "c1", True)], 4, False))
+        self.assertEqual(feed.since(0, limit=2), ([(2, "items", "i2", False),
+                                                   (3, "items", "i1", False)], 3, True))
+        self.assertEqual(feed.since(3), ([(4, "containers", "c1", True)], 4, False))
+        self.assertIsNone(feed.since(5))
+
+    def test_forgetting_raises_the_floor(self):
+        feed = ChangeFeed(capacity=2)
+        for number in range(4):
+            feed.record("items", f"i{number}")
+
+        self.assertEqual(feed.floor, 2)
+        self.assertIsNone(feed.since(1))
+        self.assertEqual(feed.since(2)[0], [(3, "items", "i2", False), (4, "items", "i3", False)])
+
+    def test_memory_stays_bounded_with_unique_keys(self):
+        feed = ChangeFeed(capacity=100)
+        for number in range(100000):
+            feed.record("items", f"i{number}")
+
+        self.assertEqual(len(feed.latest), 100)
+        self.assertLessEqual(len(feed.seqs), 2 * 100 + COMPACT_SLACK)
+        self.assertEqual(len(feed.seqs), len(feed.entries))
+        changes, next_seq, has_more = feed.since(feed.floor)
+        self.assertEqual([change[2] for change in changes], [f"i{number}" for number in range(99900, 100000)])
+        self.assertEqual((next_seq, has_more), (100000, False))
+
+    def test_memory_stays_bounded_with_repeated_keys(self):
+        feed = ChangeFeed(capacity=100)
+        for number in range(100000):
+            feed.record("items", f"i{number % 50}")
+
+        self.assertLessEqual(len(feed.seqs), 2 * 50 + COMPACT_SLACK + 1)
+        self.assertEqual(len(feed.since(0)[0]), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
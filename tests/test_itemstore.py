@@ -0,0 +1,104 @@
+#test_itemstore.py
+import unittest
+import random
+
+from itemstore import ColumnarItemStore, iter_records, unplaced_item_ids
+
+
+def sample_items(count, seed=7):
+    rng = random.Random(seed)
+    items = []
+    for number in range(count):
+        item = {
+            "itemId": f"item{number}",
+            "name": f"Item {number}",
+            "width": rng.randint(1, 50),
+            "depth": rng.uniform(0.5, 50),
+            "height": 10.0,
+            "mass": rng.choice([1, 2.5, None]),
+            "priority": rng.randint(1, 100),
+            "preferredZone": rng.choice(["Crew Quarters", "Airlock", None]),
+            "containerId": None,
+            "position": None
+        }
+        if rng.random() < 0.5:
+            item["containerId"] = f"cont{number % 7}"
+            item["position"] = {"startCoordinates": [0, 0, 0], "endCoordinates": [1, 2.5, 3]}
+        if rng.random() < 0.3:
+            item["perishable"] = True
+            item["expiryDate"] = "2025-05-20T00:00:00"
+        items.append(item)
+    return items
+
+
+# Values that do not fit a column and have to round-trip through the extras
+ODD_ITEMS = [
+    {"itemId": "numeric-container", "containerId": 7, "position": None},
+    {"itemId": "list-zone", "preferredZone": ["A", "B"], "containerId": None},
+    {"itemId": "bool-priority", "priority": True, "perishable": 1},
+    {"itemId": "odd-position", "containerId": "c1", "position": {"startCoordinates": [0, 0]}},
+    {"itemId": "extra-fields", "tags": ["fragile"], "notes": {"owner": "crew"}},
+    {"itemId": "no-container"},
+    {"itemId": "renamed", "itemId2": "other"},
+]
+
+
+class TestColumnarItemStore(unittest.TestCase):
+    def fill(self, records):
+        store = ColumnarItemStore(capacity=4)
+        reference = {}
+        for record in records:
+            store[record["itemId"]] = dict(record)
+            reference[record["itemId"]] = dict(record)
+        return store, reference
+
+    def assertSameAsDict(self, store, reference):
+        self.assertEqual(len(store), len(reference))
+        self.assertEqual(list(store), list(reference))
+        for item_id, record in reference.items():
+            self.assertEqual(store[item_id], record)
+        self.assertEqual(list(iter_records(store)), list(iter_records(reference)))
+        self.assertEqual(unplaced_item_ids(store), unplaced_item_ids(reference))
+
+    def test_round_trip_matches_dict(self):
+        store, reference = self.fill(sample_items(200) + ODD_ITEMS)
+        self.assertSameAsDict(store, reference)
+
+    def test_updates_and_removals_match_dict(self):
+        store, reference = self.fill(sample_items(100))
+        rng = random.Random(3)
+        for number in range(300):
+            item_id = f"item{rng.randrange(150)}"
+            action = rng.random()
+            if action < 0.3 and item_id in reference:
+                self.assertEqual(store.pop(item_id), reference.pop(item_id))
+            elif action < 0.6 and item_id in reference:
+                record = dict(reference[item_id], containerId=rng.choice([None, "cont1", 7]),
+                              position=None)
+                store[item_id] = dict(record)
+                reference[item_id] = record
+            else:
+                record = dict(rng.choice(ODD_ITEMS + sample_items(3, seed=number)), itemId=item_id)
+                store[item_id] = dict(record)
+                reference[item_id] = record
+        self.assertSameAsDict(store, reference)
+        self.assertEqual(store.get("missing", "default"), "default")
+        self.assertEqual(store.pop("missing", None), None)
+
+    def test_unplaced_ids_skip_items_with_uncoded_container(self):
+        store, reference = self.fill(ODD_ITEMS)
+        unplaced = unplaced_item_ids(store)
+        self.assertNotIn("numeric-container", unplaced)
+        self.assertIn("no-container", unplaced)
+        self.assertEqual(unplaced, unplaced_item_ids(reference))
+
+    def test_whole_floats_come_back_as_ints(self):
+        store, _ = self.fill([{"itemId": "i1", "width": 2.0, "depth": 2.5,
+                               "position": {"startCoordinates": [0.0, 0, 0], "endCoordinates": [2, 2.5, 1]}}])
+        item = store["i1"]
+        self.assertEqual(type(item["width"]), int)
+        self.assertEqual(item["depth"], 2.5)
+        self.assertEqual(item["position"]["startCoordinates"], [0, 0, 0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,233 @@
+#test_persistence.py
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+import persistence
+from persistence import WriteAheadLog, SQLiteStore, SNAPSHOT_NAME
+
+
+def container_op(container_id, **fields):
+    return {"op": "container", "record": dict({"containerId": container_id}, **fields)}
+
+
+def item_op(item_id, **fields):
+    return {"op": "item", "record": dict({"itemId": item_id}, **fields)}
+
+
+def final_state(ops):
+    # Replays operations the way recover_state does
+    state = {"containers": {}, "items": {}, "currentTime": None}
+    for op in ops:
+        if op['op'] == 'container':
+            state["containers"][op['record']['containerId']] = op['record']
+        elif op['op'] == 'item':
+            state["items"][op['record']['itemId']] = op['record']
+        elif op['op'] == 'remove':
+            state["items"].pop(op['itemId'], None)
+        elif op['op'] == 'time':
+            state["currentTime"] = op['currentTime']
+    return state
+
+
+class TestWriteAheadLog(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def commit(self, wal, *ops, state_ops=None):
+        for op in ops:
+            wal.log(op)
+        wal.commit(state_ops)
+
+    def test_recovers_committed_operations(self):
+        wal = WriteAheadLog(self.data_dir)
+        self.commit(wal, container_op("c1", zone="A"), item_op("i1", name="Kit"))
+        self.commit(wal, item_op("i1", name="Kit", containerId="c1"), item_op("i2"))
+        self.commit(wal, {"op": "remove", "itemId": "i2"},
+                    {"op": "time", "currentTime": "2025-01-02T00:00:00"})
+
+        state = final_state(WriteAheadLog(self.data_dir).recover())
+        self.assertEqual(list(state["containers"]), ["c1"])
+        self.assertEqual(state["items"], {"i1": {"itemId": "i1", "name": "Kit", "containerId": "c1"}})
+        self.assertEqual(state["currentTime"], "2025-01-02T00:00:00")
+
+    def test_uncommitted_operations_are_not_written(self):
+        wal = WriteAheadLog(self.data_dir)
+        self.commit(wal, item_op("i1"))
+        wal.log(item_op("i2"))
+        wal.rollback()
+        wal.commit()
+
+        state = final_state(WriteAheadLog(self.data_dir).recover())
+        self.assertEqual(list(state["items"]), ["i1"])
+
+    def test_commit_only_writes_its_own_thread(self):
+        wal = WriteAheadLog(self.data_dir)
+        logged = threading.Event()
+        committed = threading.Event()
+
+        def other_request():
+            wal.log(item_op("other"))
+            logged.set()
+            committed.wait(5)
+            wal.commit()
+
+        thread = threading.Thread(target=other_request)
+        thread.start()
+        logged.wait(5)
+        self.commit(wal, item_op("mine"))
+        self.assertEqual(list(final_state(WriteAheadLog(self.data_dir).recover())["items"]), ["mine"])
+        committed.set()
+        thread.join()
+        self.assertEqual(sorted(final_state(WriteAheadLog(self.data_dir).recover())["items"]),
+                         ["mine", "other"])
+
+    def test_torn_last_line_ends_replay(self):
+        wal = WriteAheadLog(self.data_dir)
+        self.commit(wal, item_op("i1"), item_op("i2"))
+        path = os.path.join(self.data_dir, "wal-00000001.log")
+        with open(path, 'a', encoding='utf-8') as segment:
+            segment.write('{"op": "item", "record": {"itemId": "i3"')
+
+        recovered = list(WriteAheadLog(self.data_dir).recover())
+        self.assertEqual([op['record']['itemId'] for op in recovered], ["i1", "i2"])
+
+    def test_snapshot_rotates_segments(self):
+        wal = WriteAheadLog(self.data_dir, snapshot_every=3)
+        state = {}
+
+        def state_ops():
+            return iter(list(state.values()))
+
+        for number in range(3):
+            op = item_op(f"i{number}", version=1)
+            state[f"i{number}"] = op
+            self.commit(wal, op, state_ops=state_ops)
+        wal.snapshot_thread.join()
+
+        # The snapshot replaced the first segment, later commits go to the next one
+        self.assertTrue(os.path.exists(os.path.join(self.data_dir, SNAPSHOT_NAME)))
+        self.assertFalse(os.path.exists(os.path.join(self.data_dir, "wal-00000001.log")))
+        op = item_op("i0", version=2)
+        state["i0"] = op
+        self.commit(wal, op, {"op": "remove", "itemId": "i1"})
+        self.assertTrue(os.path.exists(os.path.join(self.data_dir, "wal-00000002.log")))
+
+        recovered = final_state(WriteAheadLog(self.data_dir).recover())
+        self.assertEqual(recovered["items"], {"i0": {"itemId": "i0", "version": 2},
+                                              "i2": {"itemId": "i2", "version": 1}})
+
+    def test_reopened_log_appends_after_snapshot_segment(self):
+        wal = WriteAheadLog(self.data_dir, snapshot_every=1)
+        self.commit(wal, item_op("i1"), state_ops=lambda: iter([item_op("i1")]))
+        wal.snapshot_thread.join()
+
+        reopened = WriteAheadLog(self.data_dir)
+        list(reopened.recover())
+        self.commit(reopened, item_op("i2"))
+        recovered = final_state(WriteAheadLog(self.data_dir).recover())
+        self.assertEqual(sorted(recovered["items"]), ["i1", "i2"])
+
+
+class TestSQLiteStore(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.data_dir, "station.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def write(self, store, *ops):
+        store.begin(write=True)
+        for op in ops:
+            store.log(op)
+        store.commit()
+
+    def test_recovers_committed_state(self):
+        store = SQLiteStore(self.path)
+        self.write(store, container_op("c1", zone="A"), item_op("i1"), item_op("i2"),
+                   {"op": "time", "currentTime": "2025-01-02T00:00:00"})
+        self.write(store, item_op("i1", containerId="c1"), {"op": "remove", "itemId": "i2"})
+
+        state = final_state(SQLiteStore(self.path).recover())
+        self.assertEqual(list(state["containers"]), ["c1"])
+        self.assertEqual(state["items"], {"i1": {"itemId": "i1", "containerId": "c1"}})
+        self.assertEqual(state["currentTime"], "2025-01-02T00:00:00")
+
+    def test_rollback_discards_the_request(self):
+        store = SQLiteStore(self.path)
+        self.write(store, item_op("i1"))
+        store.begin(write=True)
+        store.log(item_op("i2"))
+        store.rollback()
+
+        state = final_state(SQLiteStore(self.path).recover())
+        self.assertEqual(list(state["items"]), ["i1"])
+
+    def test_other_processes_catch_up(self):
+        first = SQLiteStore(self.path)
+        second = SQLiteStore(self.path)
+        list(first.recover())
+        list(second.recover())
+
+        self.write(first, item_op("i1"), item_op("i2"))
+        self.write(first, {"op": "remove", "itemId": "i1"})
+        self.assertTrue(second.behind())
+        self.assertEqual(second.catch_up(),
+                         [item_op("i1"), item_op("i2"), {"op": "remove", "itemId": "i1"}])
+        # Changes are handed out once, and a process never gets its own back
+        self.assertFalse(second.behind())
+        self.assertEqual(second.catch_up(), [])
+        self.assertFalse(first.behind())
+
+    def test_pruned_changes_reload_the_state(self):
+        first = SQLiteStore(self.path)
+        second = SQLiteStore(self.path)
+        list(first.recover())
+        list(second.recover())
+
+        with mock.patch.object(persistence, 'CHANGE_RETENTION', 2):
+            for number in range(5):
+                self.write(first, item_op(f"i{number}"))
+        ops = second.catch_up()
+        self.assertEqual(ops[0], {"op": "reset"})
+        self.assertEqual(sorted(final_state(ops[1:])["items"]), [f"i{number}" for number in range(5)])
+
+    def test_change_feed_is_shared_by_processes(self):
+        first = SQLiteStore(self.path)
+        second = SQLiteStore(self.path)
+        list(first.recover())
+        list(second.recover())
+        self.assertEqual(first.feed_id, second.feed_id)
+
+        self.write(first, container_op("c1"), item_op("i1"), item_op("i2"))
+        self.write(first, item_op("i1", containerId="c1"), {"op": "remove", "itemId": "i2"},
+                   {"op": "time", "currentTime": "2025-01-02T00:00:00"})
+        # Only changes this process has applied are served
+        self.assertEqual(second.changes_since(0), ([], 0, False))
+        second.catch_up()
+
+        changes, next_seq, has_more = second.changes_since(0)
+        self.assertEqual(changes, [(1, "containers", "c1", False), (4, "items", "i1", False),
+                                   (5, "items", "i2", True)])
+        self.assertEqual((next_seq, has_more), (6, False))
+        self.assertEqual(second.changes_since(0, limit=2), ([(1, "containers", "c1", False),
+                                                            (2, "items", "i1", False)], 2, True))
+        self.assertEqual(second.changes_since(2, limit=2), ([(3, "items", "i2", False),
+                                                            (4, "items", "i1", False)], 4, True))
+        self.assertIsNone(second.changes_since(7))
+
+        with mock.patch.object(persistence, 'CHANGE_RETENTION', 2):
+            self.write(first, item_op("i3"))
+        second.catch_up()
+        self.assertIsNone(second.changes_since(0))
+        self.assertEqual(second.changes_since(5)[0], [(7, "items", "i3", False)])
+
+if __name__ == '__main__':
+    unittest.main()